@@ -109,7 +109,8 @@ def make_parameters_file(filepath=None, layers=1, species=1, data=False,
         *If [dict, ..., dict] is passed*:
             Each dict in this list should have the following key-value pairs:
                 KEY                    VALUE
-                'type':                {'random', 'defined', 'file', 'nlmpy'}
+                'type':                {'random', 'defined', 'file', 'nlmpy',
+                                        'spectral'}
 
                 'change':               bool
 
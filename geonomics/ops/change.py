@@ -21,6 +21,7 @@ from operator import attrgetter as ag
 from collections import OrderedDict as OD
 from collections import Counter as C
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 
 
 ######################################
@@ -100,6 +101,86 @@ class _Changer:
         self.changes = iter(changes)
 
 
+#class for streaming the rasters of a directory-based change event from
+#disk, reading and rescaling each raster only when it is needed, while a
+#background thread prefetches the next raster in the series (so that
+#model timesteps do not wait on disk)
+class _RasterDirectorySeries:
+    def __init__(self, filepaths, coord_prec, dim, scale_min, scale_max,
+                 lyr_idx, window=None, target_res=None):
+        self.filepaths = filepaths
+        self.coord_prec = coord_prec
+        self.dim = dim
+        self.window = window
+        self.target_res = target_res
+        self.scale_min = scale_min
+        self.scale_max = scale_max
+        self.lyr_idx = lyr_idx
+        #create a dict to hold the futures of the prefetched rasters,
+        #keyed by their indices in the series
+        self._prefetched = {}
+        #the executor is created when first needed, and shut down once the
+        #last raster in the series has been read, so that no thread is left
+        #running after the change event
+        self._executor = None
+        #start prefetching the first raster
+        self._prefetch(0)
+
+    #read and rescale the raster at the given index in the series
+    def _read(self, i):
+        rast = io._read_raster(self.filepaths[i], self.coord_prec,
+                               self.dim, window = self.window,
+                               target_res = self.target_res)[0]
+        rast, scale_min_out, scale_max_out = spt._scale_raster(rast,
+                                            self.scale_min, self.scale_max)
+        assert (self.scale_min == scale_min_out
+                and self.scale_max == scale_max_out), ("The scale_min and "
+                                                  "scale_max values "
+                                                  "returned from scaling "
+                                                  "the input change "
+                                                  "raster %s don't match "
+                                                  "those of Layer %i, to "
+                                                  "which the raster "
+                                                  "corresponds.") % (
+                                            self.filepaths[i], self.lyr_idx)
+        return rast
+
+    #start reading the raster at the given index in a background thread,
+    #if it exists and is not already being read
+    def _prefetch(self, i):
+        if i < len(self.filepaths) and i not in self._prefetched:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers = 1)
+            self._prefetched[i] = self._executor.submit(self._read, i)
+
+    #get the raster at the given index (waiting for it to be read, if
+    #necessary), then start prefetching the next raster (or shut down the
+    #background thread, if that was the last raster)
+    def _get_rast(self, i):
+        self._prefetch(i)
+        try:
+            rast = self._prefetched.pop(i).result()
+        finally:
+            if i + 1 >= len(self.filepaths):
+                self._shutdown()
+        self._prefetch(i + 1)
+        return rast
+
+    #shut down the background thread (after it finishes any raster it is
+    #reading), dropping any prefetched rasters (which will be read again,
+    #if they are needed)
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._prefetched = {}
+
+    #shut down before copying or pickling (since threads can't be copied)
+    def __getstate__(self):
+        self._shutdown()
+        return self.__dict__.copy()
+
+
 class _LandscapeChanger(_Changer):
     def __init__(self, land, land_change_params, mod):
         super(_LandscapeChanger, self).__init__(land_change_params)
@@ -298,13 +379,24 @@ class _SpeciesChanger(_Changer):
     #########################
 
 # function that takes a starting rast, its layer, an ending rast, a few
-# timestep arguments, and returns a linearly interpolated stack of rasters
+# timestep arguments, and returns a linearly interpolated series of rasters
+# (NOTE: for a linear change event, i.e. when change_rast is an array or a
+# file, the series holds functions that each compute their timestep's
+# raster on the fly, from only the start and end rasters, rather than
+# holding all n_steps rasters in memory; for a directory of rasters, the
+# series holds functions that each read their raster from disk, via a
+# _RasterDirectorySeries; use _get_series_rast to get the raster from any
+# item in a series)
 def _make_lyr_series(lyr, change_rast, start_t, end_t, n_steps,
                      coord_prec=0):
     start_rast = lyr.rast
     dim = lyr.dim
     scale_min = lyr._scale_min
     scale_max = lyr._scale_max
+    #(change rasters read from file are read with the same window and
+    #target resolution as the Layer, if any)
+    window = lyr._window
+    target_res = lyr._target_res
 
     #get (rounded) evenly spaced timesteps at which to implement the changes
     timesteps = np.int64(np.round(np.linspace(start_t, end_t, n_steps)))
@@ -327,8 +419,9 @@ def _make_lyr_series(lyr, change_rast, start_t, end_t, n_steps,
         elif os.path.isfile(change_rast):
             #NOTE: this resets dim from the argument that was fed in
             change_rast, dim, res, ulc, prj = io._read_raster(change_rast,
-                                                              coord_prec,
-                                                              dim=dim)
+                                                    coord_prec, dim=dim,
+                                                    window=window,
+                                                    target_res=target_res)
             # scale the raster correctly
             change_rast, scale_min_out, scale_max_out = spt._scale_raster(
                                             change_rast, scale_min, scale_max)
@@ -341,19 +434,17 @@ def _make_lyr_series(lyr, change_rast, start_t, end_t, n_steps,
                                                       "those of Layer, to "
                                                       "which the raster "
                                                       "corresponds.") % lyr.idx
-        #flatten the start and end rasters
-        start = start_rast.flatten()
-        end = change_rast.flatten()
-        #get a column of values for each grid cell on the landscape, linearly
-        #spaced between that cell's start and end values
-        #NOTE: linspace(..., ..., n+1)[1:] gives us the changed rasters
-        #for n steps, leaving off the starting lyr value because that's
-        #already the existing lyr so we don't want that added into our changes
-        rast_series = np.vstack([np.linspace(start[i],
-            end[i], n_steps+1)[1:] for i in range(len(start))])
-        #then reshape each timeslice into the dimensions of start_rast
-        rast_series = [rast_series[:,i].reshape(
-            start_rast.shape) for i in range(rast_series.shape[1])]
+        #copy the start raster, and reshape the end raster to match it
+        start = start_rast.copy()
+        end = np.reshape(change_rast, start_rast.shape)
+        #get a function for each of the n steps that will compute that
+        #step's raster, linearly spaced between each cell's start and end
+        #values, when called at its timestep
+        #NOTE: steps 1 to n give us the changed rasters for n steps, leaving
+        #off the starting lyr value because that's already the existing lyr
+        #so we don't want that added into our changes
+        rast_series = [_get_linear_change_rast_fn(start, end, step,
+                                n_steps) for step in range(1, n_steps+1)]
 
     #elif it's a directory
     elif isinstance(change_rast, str) and os.path.isdir(change_rast):
@@ -375,12 +466,15 @@ def _make_lyr_series(lyr, change_rast, start_t, end_t, n_steps,
         steps_and_files = {int(
             os.path.splitext(f.split('_')[0])[0]):f for f in files}
         files = [steps_and_files[i] for i in sorted(steps_and_files.keys())]
-        #read in the whole series, check all prj, dim, ulc, and res values
-        #are equal, then set the prj, dim, ulc, and res values, and
-        #set rasters equal to rast_series
-        all_rasts = [io._read_raster(os.path.join(
-            change_rast, f), coord_prec, dim) for f in files]
-        dim_cts = C([i[1] for i in all_rasts])
+        #read in only the metadata of the whole series, check all prj, dim,
+        #ulc, and res values are equal, then set the prj, dim, ulc, and res
+        #values (the rasters themselves will be streamed from disk, each
+        #read and rescaled at its timestep)
+        filepaths = [os.path.join(change_rast, f) for f in files]
+        all_metadata = [io._read_raster_metadata(filepath, coord_prec,
+                            dim, window=window,
+                            target_res=target_res) for filepath in filepaths]
+        dim_cts = C([i[0] for i in all_metadata])
         assert len(dim_cts) == 1, ("The dimensions of "
             "all files in the directory provided for the 'change_rast' "
             "parameter are not equal. Most files have dimensions %s, but the "
@@ -389,8 +483,8 @@ def _make_lyr_series(lyr, change_rast, start_t, end_t, n_steps,
             str([files[k] for k,v in dim_cts.items() if v != max(
             dim_cts.values())]))
         #NOTE: this resets dim from the argument that was fed in
-        dim = all_rasts[0][1]
-        res_cts = C([tuple([*i[2]]) for i in all_rasts])
+        dim = all_metadata[0][0]
+        res_cts = C([tuple([*i[1]]) for i in all_metadata])
         assert len(res_cts) == 1, ("The spatial resolutions of "
             "all files in the directory provided for the 'change_rast' "
             "parameter are not equal. Most files have resolution %s, but the "
@@ -398,8 +492,8 @@ def _make_lyr_series(lyr, change_rast, start_t, end_t, n_steps,
             str([k for k,v in res_cts.items() if v == max(res_cts.values())]),
             str([files[k] for k,v in res_cts.items() if v != max(
             res_cts.values())]))
-        res = all_rasts[0][2]
-        ulc_cts = C([tuple([*i[3]]) for i in all_rasts])
+        res = all_metadata[0][1]
+        ulc_cts = C([tuple([*i[2]]) for i in all_metadata])
         assert len(ulc_cts) == 1, ("The upper left corners of "
             "all files in the directory provided for the 'change_rast' "
             "parameter are not equal. Most files have upper left corner %s, "
@@ -407,8 +501,8 @@ def _make_lyr_series(lyr, change_rast, start_t, end_t, n_steps,
             str([k for k,v in ulc_cts.items() if v == max(ulc_cts.values())]),
             str([files[k] for k,v in ulc_cts.items() if v != max(
             ulc_cts.values())]))
-        ulc = all_rasts[0][3]
-        prj_cts = C([i[4] for i in all_rasts])
+        ulc = all_metadata[0][2]
+        prj_cts = C([i[3] for i in all_metadata])
         assert len(prj_cts) == 1, ("The projections of "
             "all files in the directory provided for the 'change_rast' "
             "parameter are not equal. Most files have projection %s, but the "
@@ -416,29 +510,19 @@ def _make_lyr_series(lyr, change_rast, start_t, end_t, n_steps,
             str([k for k,v in prj_cts.items() if v == max(prj_cts.values())]),
             str([files[k] for k,v in prj_cts.items() if v != max(
             prj_cts.values())]))
-        prj = all_rasts[0][4]
-        rast_series = [i[0] for i in all_rasts]
-        # rescale the rasters
-        rasts_and_scale_vals = [spt._scale_raster(
-                        rast, scale_min, scale_max) for rast in rast_series]
-        assert len(set([i[1] for i in rasts_and_scale_vals])) == 1, (
-            "More than one unique scale_min value was returned from rescaling "
-            "the directory of rasters provided for Layer %i.") % lyr.idx
-        assert len(set([i[2] for i in rasts_and_scale_vals])) == 1, (
-            "More than one unique scale_max value was returned from rescaling "
-            "the directory of rasters provided for Layer %i.") % lyr.idx
-        scale_min_out = rasts_and_scale_vals[0][1]
-        scale_max_out = rasts_and_scale_vals[0][2]
-        assert (scale_min == scale_min_out
-                and scale_max == scale_max_out), ("The scale_min and "
-                                                  "scale_max values "
-                                                  "returned from scaling "
-                                                  "the input change "
-                                                  "rasters don't match "
-                                                  "those of Layer %i, to "
-                                                  "which the raster "
-                                                  "corresponds.") % lyr.idx
-        rast_series = [i[0] for i in rasts_and_scale_vals]
+        prj = all_metadata[0][3]
+        #check that the Layer has fixed scale_min and scale_max values
+        #(otherwise each raster would be rescaled to its own min and max)
+        assert scale_min is not None and scale_max is not None, ("The "
+            "scale_min and scale_max values of Layer %i must be set, to "
+            "rescale the directory of rasters provided for it.") % lyr.idx
+        #get a function for each raster that will read and rescale it
+        #(from the streamed series) when called at its timestep
+        dir_series = _RasterDirectorySeries(filepaths, coord_prec,
+                        lyr.dim, scale_min, scale_max, lyr.idx,
+                        window = window, target_res = target_res)
+        rast_series = [_get_directory_rast_fn(dir_series,
+                                        i) for i in range(len(filepaths))]
         #try to get the timesteps from the filenames
         try:
             timesteps = [int(os.path.splitext(
@@ -564,9 +648,37 @@ def _make_custom_lyr_series(lyr_dict):
     pass
 
 
+#get a function that computes a single step's raster of a linear change
+#event, from the event's start and end rasters (giving the same values as
+#np.linspace(start, end, n_steps+1)[step] would for each cell)
+def _get_linear_change_rast_fn(start, end, step, n_steps):
+    def fn(start = start, end = end, step = step, n_steps = n_steps):
+        if step == n_steps:
+            return end.copy()
+        rast = step * ((end - start) / n_steps) + start
+        return rast
+    return(fn)
+
+
+#get a function that gets a single raster from a streamed
+#_RasterDirectorySeries
+def _get_directory_rast_fn(dir_series, i):
+    def fn(dir_series = dir_series, i = i):
+        return dir_series._get_rast(i)
+    return(fn)
+
+
+#get the raster from an item in a lyr series (computing it now, if
+#the item is a linear-change or directory raster function)
+def _get_series_rast(rast):
+    if callable(rast):
+        rast = rast()
+    return rast
+
+
 def _get_lyr_change_fn(lyr_num, new_lyr_rast):
     def fn(changer, land, lyr_num = lyr_num, new_lyr_rast = new_lyr_rast):
-        land._set_raster(lyr_num, new_lyr_rast)
+        land._set_raster(lyr_num, _get_series_rast(new_lyr_rast))
     return(fn)
 
 
@@ -587,7 +699,7 @@ def _make_conductance_surface_series(land, start_lyr, mixture, kappa,
     dummy_lyr = deepcopy(start_lyr)
     for t, rast in conglom_lyr_series:
         #change the lyr's raster
-        dummy_lyr.rast = rast
+        dummy_lyr.rast = _get_series_rast(rast)
         #then create a Movement_Surface using the copied Landscape
         surf_series.append((t, spt._ConductanceSurface(dummy_lyr, mixture,
             approx_len = approx_len, vm_distr_kappa = kappa)))
@@ -8,6 +8,7 @@ Functions to implement demographic operations (birth and death).
 #geonomics imports
 from geonomics.ops.selection import _calc_prob_death
 from geonomics.utils.viz import _check_display
+from geonomics.utils.spatial import _refine_raster
 
 #other imports
 import numpy as np
@@ -18,7 +19,6 @@ from numpy import random as r
 from scipy import interpolate
 from sklearn.preprocessing import normalize
 from collections import OrderedDict as OD
-from operator import itemgetter
 
 
 ######################################
@@ -34,7 +34,15 @@ class _DebugPlotter:
         self.spp = spp
         self.land = land
 
-    def _next_plot(self, varname, var):
+    def _next_plot(self, varname, var, mask=None):
+        #fill the tiles' values into a full raster, if using tiled demography
+        if mask is not None:
+            var = _fill_tiles(var, mask)
+        #and refine it to the landscape's resolution, if using coarsened
+        #demography
+        if self.spp.demography_coarsening_factor > 1:
+            var = _refine_raster(var, self.spp.demography_coarsening_factor,
+                                 self.spp._dens_grids.land_gi.shape)
         if self.subplot <= 248:
             if not plt.get_fignums():
                 fig = plt.figure()
@@ -57,7 +65,10 @@ class _DebugPlotter:
 # -----------------------------------#
 ######################################
 
-def _calc_n_pairs(pairs, spp):
+#NOTE: if a boolean mask of landscape cells is provided (i.e. for tiled
+#demography) then a 1d array of only those cells' values is returned,
+#and if coarse is True then the raster is calculated on the coarsened raster
+def _calc_n_pairs(pairs, spp, mask=None, coarse=False):
     #if there are pairs
     if pairs.size > 0:
         #get their coordinates
@@ -78,19 +89,64 @@ def _calc_n_pairs(pairs, spp):
         #set to dispersal_mu, leading of course to huge lags in the old 
         #calc_density algorithm) need to think about whether I need to attend
         #to this, and if so, how
-        n_pairs = np.clip(spp._dens_grids._calc_density(p_x, p_y), a_min = 0,
-                                                                a_max = None)
+        n_pairs = np.clip(spp._dens_grids._calc_density(p_x, p_y,
+                    mask = mask, coarse = coarse), a_min = 0, a_max = None)
 
         #remove NaNs
         n_pairs[np.isnan(n_pairs)] = 0
 
-    #otherwise just return a 0 raster
+    #otherwise just return a 0 raster (or 0 array, for only the masked cells)
+    elif mask is not None:
+        n_pairs = np.zeros(mask.sum())
+    elif coarse:
+        n_pairs = np.zeros(spp._dens_grids.coarse_gi.shape)
     else:
         n_pairs = np.zeros(spp._land_dim)
 
     return n_pairs
 
 
+#get the boolean mask of the landscape cells on which to calculate the
+#demographic rasters for tiled demography, i.e. all cells within tiles
+#that are occupied by individuals or adjacent to occupied tiles
+#(using the species' density-grid window width as the tile width),
+#on either the landscape's raster or the coarsened raster
+def _get_tiles_mask(spp, coarse=False):
+    factor = spp._dens_grids.coarsening_factor if coarse else 1
+    tile_width = max(1, int(spp._dens_grids.window_width // factor))
+    dim = spp._dens_grids.coarse_gi.shape if coarse else (
+                                            spp._dens_grids.land_gi.shape)
+    cells = _get_demography_cells(spp, coarse = coarse)
+    n_tiles = (int(np.ceil(dim[0] / tile_width)),
+               int(np.ceil(dim[1] / tile_width)))
+    tiles = np.zeros(n_tiles, dtype = np.bool_)
+    tiles[cells[:,1] // tile_width, cells[:,0] // tile_width] = True
+    #add all tiles adjacent to occupied tiles
+    padded = np.pad(tiles, 1)
+    tiles = np.any([padded[1+i: 1+i+n_tiles[0], 1+j: 1+j+n_tiles[1]] for (
+                    i) in [-1, 0, 1] for j in [-1, 0, 1]], axis = 0)
+    #expand the tiles to the landscape's cells
+    mask = np.repeat(np.repeat(tiles, tile_width, axis = 0), tile_width,
+                     axis = 1)[:dim[0], :dim[1]]
+    return mask
+
+
+#get the individuals' cells on the raster on which demography is calculated
+#(i.e. their cells on the coarsened raster, if coarse is True)
+def _get_demography_cells(spp, coarse=False):
+    if coarse:
+        return spp.cells // spp._dens_grids.coarsening_factor
+    return spp.cells
+
+
+#fill a 1d array of the masked cells' values from tiled demography
+#into a full landscape raster (with zeros in all other cells)
+def _fill_tiles(vals, mask):
+    rast = np.zeros(mask.shape)
+    rast[mask] = vals
+    return rast
+
+
 #the logistic eqxn
 def _calc_logistic_growth(R, N, K):
     dNdt = R*(1-(N/K))*N
@@ -173,21 +229,33 @@ def _calc_d(N_d, N, d_min, d_max):
 
 
 def _do_mortality(spp, death_probs):
-    deaths = np.array([*spp])[np.bool8(r.binomial(n = 1, p = death_probs))]
+    #draw deaths as a boolean mask (aligned with the species' individuals,
+    #and thus with its coords and cells arrays)
+    dead = np.bool_(r.binomial(n = 1, p = death_probs))
+    deaths = np.fromiter(spp.keys(), dtype = np.int64,
+                         count = len(spp))[dead]
     if len(deaths) > 0:
-        ig = itemgetter(*deaths)
         [spp.pop(ind) for ind in deaths];
+        #compact the coords and cells arrays with the same mask,
+        #rather than regathering them from all surviving individuals
+        spp.coords = spp.coords[~dead]
+        spp.cells = spp.cells[~dead]
     return len(deaths)
 
 
 def _do_pop_dynamics(spp, land, with_selection = True, burn = False,
-    births_before_deaths = False, asserts = True, debug = False):
+    births_before_deaths = False, validation = 'full', debug = False):
     '''Generalized function for implementation population dynamics.
     Will carry out one round of mating and death, according to parameterization
     laid out in params dict (which were grabbed as Species attributes).
 
        If with_selection == False, only density-dependent death will occur.
 
+       The validation level ('off', 'cheap', or 'full') determines which
+       checks are run: 'full' checks all of the intermediate rasters,
+       'cheap' checks only the final per-individual death probabilities,
+       and 'off' runs no checks.
+
        If burn == True, selection will be coerced to False, the Species.K
        attribute will be updated, stationarity metrics will be assessed, and
        the function will return the decision it has reached regarding
@@ -207,88 +275,134 @@ def _do_pop_dynamics(spp, land, with_selection = True, burn = False,
     #find mating pairs
     pairs = spp._find_mating_pairs()
 
+    #if using tiled demography, then get the individuals' coordinates
+    #(from which density will be calculated, exactly as it otherwise would
+    #be), then mate and disperse zygotes now, so that the demographic
+    #rasters need only be calculated on the landscape tiles occupied by
+    #(or adjacent to tiles occupied by) all individuals, including offspring
+    #(all other cells' values would never be used, because individuals'
+    #death probabilities are only drawn from their own cells)
+    #NOTE: if the species' demography_coarsening_factor is greater than 1,
+    #then all of the demographic rasters are instead calculated on the
+    #correspondingly coarsened raster (with K being coarsened to the mean
+    #of its cells' values, and density still being estimated per cell
+    #of the landscape's raster), and each individual's density-dependent
+    #death probability is taken from the coarse cell containing it
+    coarse = spp.demography_coarsening_factor > 1
+    mask = None
+    mated = False
+    if spp.tiled_demography:
+        if births_before_deaths:
+            spp._do_mating(land, pairs, burn)
+        x = spp._get_x()
+        y = spp._get_y()
+        if not births_before_deaths:
+            spp._do_mating(land, pairs, burn)
+        mated = True
+        mask = _get_tiles_mask(spp, coarse = coarse)
+
     #calc num_pairs raster (use the calc_pop_density function on the
     #midpoints of the mating pairs)
-    n_pairs = _calc_n_pairs(pairs = pairs, spp = spp)
+    n_pairs = _calc_n_pairs(pairs = pairs, spp = spp, mask = mask,
+                            coarse = coarse)
     #run checks on n_pairs
-    if asserts:
+    if validation == 'full':
         assert n_pairs.min() >= 0, 'n_pairs.min() == %0.2f' %(n_pairs.min())
         assert not np.any(np.isnan(n_pairs))
         assert not np.any(np.isinf(n_pairs))
     #add debug plot
     if debug:
-        dp._next_plot('n_pairs', n_pairs)
+        dp._next_plot('n_pairs', n_pairs, mask = mask)
 
     #if births should happen before (and thus be included in the calculation of)
     #deaths, then mate and disperse babies now
-    if births_before_deaths:
+    if births_before_deaths and not mated:
         #Feed the land and mating pairs to spp.do_mating, to produce and
         #disperse zygotes
         spp._do_mating(land, pairs, burn)
 
     #calc N raster, set it as spp.N, then get it  
-    spp._calc_density(set_N = True)
-    N = spp.N
+    if mask is None and not coarse:
+        spp._calc_density(set_N = True)
+        N = spp.N
+    #or calculate it for only the tiles' cells, if using tiled demography,
+    #and/or on the coarsened raster, if using coarsened demography
+    else:
+        if mask is None:
+            x = spp._get_x()
+            y = spp._get_y()
+        N = np.clip(spp._dens_grids._calc_density(x, y, mask = mask,
+                    coarse = coarse), a_min = 0, a_max = None)
+        #(but always set spp.N as a full raster, which will be refined to
+        #the landscape's resolution only if spp.N is read)
+        N_rast = N if mask is None else _fill_tiles(N, mask)
+        spp._set_N(N_rast, coarse = coarse)
     #run checks on N
-    if asserts:
+    if validation == 'full':
         assert N.min() >= 0
         assert not np.any(np.isnan(N))
         assert not np.any(np.isinf(N))
     #add debug plot
     if debug:
-        dp._next_plot('N', N)
+        dp._next_plot('N', N, mask = mask)
 
     #get K raster
-    K = spp.K
+    #(or the cached coarsened K raster, if using coarsened demography)
+    if coarse:
+        K = spp._get_K_coarse()
+    else:
+        K = spp.K
+    if mask is not None:
+        K = K[mask]
     #run checks on K
-    if asserts:
+    if validation == 'full':
         assert K.min() >= 0
         assert not np.any(np.isnan(K))
         assert not np.any(np.isinf(K))
     #add debug plot
     if debug:
-        dp._next_plot('K', K)
+        dp._next_plot('K', K, mask = mask)
 
     #calc dNdt
     dNdt = _calc_dNdt(R = spp.R, N = N, K = K,
                                     pop_growth_eq = 'logistic')
     #run checks on dNdt
-    if asserts:
+    if validation == 'full':
         assert not np.any(np.isnan(dNdt))
         assert not np.any(np.isinf(dNdt)), ('The following cells are '
             'infinite: \n\t%s') % str([i for i, n in enumerate(
                                         dNdt.ravel()) if np.isinf(n)])
     #add debug plot
     if debug:
-        dp._next_plot('dNdt', dNdt)
+        dp._next_plot('dNdt', dNdt, mask = mask)
 
     #calculate N_b (raster of estimated births)
     N_b = _calc_N_b(b = spp.b,
         n_births_distr_lambda = spp.n_births_distr_lambda, n_pairs = n_pairs)
     #run checks on N_b
-    if asserts:
+    if validation == 'full':
         assert N_b.min() >= 0
         assert not np.any(np.isnan(N_b))
         assert not np.any(np.isinf(N_b))
     #add debug plot
     if debug:
-        dp._next_plot('N_b', N_b)
+        dp._next_plot('N_b', N_b, mask = mask)
 
     #calc N_d (raster of deaths)
     N_d = _calc_Nd(N_b = N_b, dNdt = dNdt)
     #run checks on N_d
-    if asserts:
+    if validation == 'full':
         assert not np.any(np.isnan(N_d))
         assert not np.any(np.isinf(N_d))
     #add debug plot
     if debug:
-        dp._next_plot('N_d', N_d)
+        dp._next_plot('N_d', N_d, mask = mask)
 
     #calc d (raster of probabilities of density-dependent death)
     d = _calc_d(N_d = N_d, N = N, d_min = spp.d_min, d_max = spp.d_max)
 
     #run checks on d
-    if asserts:
+    if validation == 'full':
         assert d.min() >= 0, 'd.min() is %0.2f, at %s' % (d.min(),
                                                         str(d.argmin()))
         assert d.max() <= 1, 'd.max() is %0.2f' % d.max()
@@ -296,7 +410,7 @@ def _do_pop_dynamics(spp, land, with_selection = True, burn = False,
         assert not np.any(np.isinf(d))
     #add debug plot
     if debug:
-        dp._next_plot('d', d)
+        dp._next_plot('d', d, mask = mask)
 
     #If births should happen after (and thus not be included in the 
     #calculation of) deaths, then instead of having mated and dispersed
@@ -314,19 +428,26 @@ def _do_pop_dynamics(spp, land, with_selection = True, burn = False,
     #the continuous/discrete time conflict. But in this case, is there any
     #strong reason to CHANGE THIS? Or are there any foreseeable and undesirable
     #results/effects?... NEED TO PUT MORE THOUGHT INTO THIS LATER.
-    if not births_before_deaths:
+    if not births_before_deaths and not mated:
         #Feed the land and mating pairs to the mating functions, to produce
         #and disperse zygotes
         spp._do_mating(land, pairs, burn)
     #Get death probabilities
-    death_probs = d[spp.cells[:,1], spp.cells[:,0]]
+    cells = _get_demography_cells(spp, coarse = coarse)
+    if mask is None:
+        death_probs = d[cells[:,1], cells[:,0]]
+    #(using a raster of each masked cell's index in the 1d array of
+    #tiled values, if using tiled demography)
+    else:
+        tile_idxs = np.cumsum(mask).reshape(mask.shape) - 1
+        death_probs = d[tile_idxs[cells[:,1], cells[:,0]]]
     #If with_selection (i.e. if death probs should account for fitness),
     #then use the d raster and individuals' fitnesses to calculate
     #per-individual probabilities of death
     if with_selection:
         death_probs = _calc_prob_death(spp, death_probs)
     #run checks on death_probs
-    if asserts:
+    if validation != 'off':
         assert np.alltrue(death_probs >= 0)
         assert np.alltrue(death_probs <= 1)
 
@@ -337,8 +458,8 @@ def _do_pop_dynamics(spp, land, with_selection = True, burn = False,
         num_killed_age = np.sum(death_probs == 1)
 
     #Use the per-individual death probabilities to carry out mortality 
+    #(which also compacts the species' coords and cells arrays)
     num_deaths = _do_mortality(spp, death_probs)
-    spp._set_coords_and_cells()
     spp.n_deaths.append(num_deaths)
 
     #Check if extinct, and return result
@@ -0,0 +1,189 @@
+#!/usr/bin/python
+# kernels.py
+
+
+'''
+Numerical kernels for the per-timestep operations (movement displacement,
+recombination gathers, fitness, and death probabilities), in
+interchangeable backends: a pure-NumPy reference backend, and an optional
+Numba-compiled backend that fuses each kernel's operations into a single
+loop, rather than a series of temporary arrays.
+
+The backend is chosen by the 'kernel_backend' model parameter
+('numpy' or 'numba'), and each Species holds its backend's kernels in its
+_kernels attribute (a dict of kernel names to functions).
+'''
+
+import numpy as np
+
+try:
+    import numba
+    _with_numba = True
+except ModuleNotFoundError:
+    _with_numba = False
+
+
+######################################
+# -----------------------------------#
+# VARIABLES -------------------------#
+# -----------------------------------#
+######################################
+
+# the minimum fitness factor for a single deleterious locus (matching the
+# minimum trait fitness)
+_MIN_DELETERIOUS_FACTOR = 0.001
+
+
+######################################
+# -----------------------------------#
+# FUNCTIONS -------------------------#
+# -----------------------------------#
+######################################
+
+#----------------#
+# NumPy backend  #
+#----------------#
+
+# displace x and y coordinates by the given directions and distances
+# (rescaled by the landscape's resolution ratios), then clip them to
+# within the landscape's dimensions
+def _displace_numpy(x, y, direction, distance, res_ratio_x, res_ratio_y,
+                    max_x, max_y):
+    # decompose distance into x and y components
+    dist_x = np.cos(direction) * distance
+    dist_y = np.sin(direction) * distance
+    # multiply the x and y distances by the land's resolution-ratios,
+    # if they're not 1 and 1 (e.g. a non-square-resolution raster was read in)
+    if res_ratio_x != 1:
+        dist_x *= res_ratio_x
+    if res_ratio_y != 1:
+        dist_y *= res_ratio_y
+    new_x = np.clip(x + dist_x, a_min=0, a_max=max_x)
+    new_y = np.clip(y + dist_y, a_min=0, a_max=max_y)
+    return new_x, new_y
+
+
+# gather a parent's gamete from its genome (L x ploidy), given
+# a recombination mask over its flattened genome and its start homologue
+def _make_gamete_numpy(genome, mask, start_homologue):
+    # flip the genome L-R before subsetting, if the start homologue is 1
+    if start_homologue:
+        genome = np.fliplr(genome)
+    gamete = genome.flatten()[mask]
+    return gamete
+
+
+# calculate a single trait's fitnesses, given the environmental values
+# of the trait's layer, phenotypes, and the trait's phi values, gamma, and
+# whether or not it has a universal advantage
+def _calc_trait_fitness_numpy(e, z, phi, gamma, univ_adv):
+    fit = 1 - phi*(abs((e**(not univ_adv)) - z)**gamma)
+    return fit
+
+
+# calculate fitnesses related to deleterious mutations for n individuals,
+# given the sparse carriers of derived deleterious alleles (i.e. the
+# carriers' row indices, their genotypes (1 or 2) at the carried loci, and
+# those loci's selection coefficients), by accumulating log-fitness over
+# only the carriers
+#NOTE: each locus' fitness factor is floored at _MIN_DELETERIOUS_FACTOR,
+#because homozygotes at loci with s > 0.5 would otherwise have negative
+#factors (and thus NaN log-fitnesses)
+def _calc_deleterious_fitness_numpy(carriers, genotypes, s, n):
+    factors = np.clip(1 - genotypes * s, a_min=_MIN_DELETERIOUS_FACTOR,
+                      a_max=None)
+    log_fit = np.bincount(carriers, weights=np.log(factors), minlength=n)
+    fit = np.exp(log_fit)
+    return fit
+
+
+# calculate death probabilities, given density-dependent
+# death probabilities and fitnesses
+def _calc_death_probs_numpy(d, w):
+    death_probs = 1-(1-d)*w
+    return death_probs
+
+
+#----------------#
+# Numba backend  #
+#----------------#
+
+if _with_numba:
+
+    @numba.njit(cache=False)
+    def _displace_numba(x, y, direction, distance, res_ratio_x, res_ratio_y,
+                        max_x, max_y):
+        new_x = np.empty(x.size)
+        new_y = np.empty(y.size)
+        for i in range(x.size):
+            new_x[i] = min(max(x[i] + (np.cos(direction[i]) * distance[i] *
+                                       res_ratio_x), 0), max_x)
+            new_y[i] = min(max(y[i] + (np.sin(direction[i]) * distance[i] *
+                                       res_ratio_y), 0), max_y)
+        return new_x, new_y
+
+
+    @numba.njit(cache=False)
+    def _make_gamete_numba(genome, mask, start_homologue):
+        ploidy = genome.shape[1]
+        gamete = np.empty(mask.sum(), dtype=genome.dtype)
+        n = 0
+        for i in range(mask.size):
+            if mask[i]:
+                loc = i // ploidy
+                homol = i % ploidy
+                # read the genome L-R flipped, if the start homologue is 1
+                if start_homologue:
+                    homol = ploidy - 1 - homol
+                gamete[n] = genome[loc, homol]
+                n += 1
+        return gamete
+
+
+    @numba.njit(cache=False)
+    def _calc_trait_fitness_numba(e, z, phi, gamma, univ_adv):
+        fit = np.empty(z.size)
+        for i in range(z.size):
+            # environmental value is 1 everywhere for a trait
+            # with universal advantage
+            if univ_adv:
+                opt = 1.0
+            else:
+                opt = e[i]
+            fit[i] = 1 - phi[i]*(abs(opt - z[i])**gamma)
+        return fit
+
+
+    @numba.njit(cache=False)
+    def _calc_deleterious_fitness_numba(carriers, genotypes, s, n):
+        fit = np.ones(n)
+        for i in range(carriers.size):
+            fit[carriers[i]] *= max(1 - genotypes[i] * s[i],
+                                    _MIN_DELETERIOUS_FACTOR)
+        return fit
+
+
+    @numba.njit(cache=False)
+    def _calc_death_probs_numba(d, w):
+        death_probs = np.empty(d.size)
+        for i in range(d.size):
+            death_probs[i] = 1 - (1 - d[i]) * w[i]
+        return death_probs
+
+
+#the kernel names, which must be defined for each backend
+_KERNEL_NAMES = ['displace', 'make_gamete', 'calc_trait_fitness',
+                 'calc_deleterious_fitness', 'calc_death_probs']
+
+
+# get the dict of kernels for the chosen backend
+def _get_kernels(backend='numpy'):
+    assert backend in ['numpy', 'numba'], ("The 'kernel_backend' parameter "
+        "must be either 'numpy' or 'numba'.")
+    if backend == 'numba' and not _with_numba:
+        raise ModuleNotFoundError(("The 'numba' kernel backend was requested "
+            "but module 'numba' could not be imported. Please install numba "
+            "or else set the 'kernel_backend' parameter to 'numpy'."))
+    kernels = {name: globals()['_%s_%s' % (name, backend)] for name in (
+                                                            _KERNEL_NAMES)}
+    return kernels
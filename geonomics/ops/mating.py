@@ -153,12 +153,14 @@ def _do_mating_sngl_offspr(spp, pair, recomb_keys):
     if len(spp.gen_arch.nonneut_loci) > 0:
         subsetters = [spp.gen_arch.recombinations._get_subsetter(
                                         event_key=k) for k in recomb_keys]
-        #NOTE: flip the genome L-R before subsetting, if the start homologue is
-        # 1, then flatten genome and subset
-        new_genome = [np.fliplr(spp[ind].g).flatten(
-            )[[*sub]] if hom else spp[ind].g.flatten(
-            )[[*sub]] for ind, hom, sub in zip(pair, 
-                                               start_homologues, subsetters)]
+        # NOTE: unpack each bitarray subsetter into a boolean mask (because
+        # iterating over a bitarray yields ints, not bools, in bitarray>=2)
+        masks = [np.frombuffer(sub.unpack(), dtype=np.bool_) for sub in (
+                                                                subsetters)]
+        #NOTE: the genome is flipped L-R before subsetting, if the start
+        # homologue is 1, then flattened and subset
+        new_genome = [spp._kernels['make_gamete'](spp[ind].g, mask, hom)
+                      for ind, hom, mask in zip(pair, start_homologues, masks)]
         new_genome = np.vstack(new_genome).T
     else:
         new_genome = None
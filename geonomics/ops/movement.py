@@ -71,25 +71,22 @@ def _do_movement(spp):
                               sigma=spp.movement_distance_distr_param2,
                               size=len(old_x))
 
-    # decompose distance into x and y components
-    dist_x = _cos(direction) * distance
-    dist_y = _sin(direction) * distance
-    # multiply the x and y distances by the land's resolution-ratios,
-    # if they're not 1 and 1 (e.g. a non-square-resolution raster was read in)
-    if spp._land_res_ratio[0] != 1:
-        dist_x *= spp._land_res_ratio[0]
-    if spp._land_res_ratio[1] != 1:
-        dist_y *= spp._land_res_ratio[1]
-
-    # create the new locations by adding x- and y-dim line segments to their
-    # current positions, using trig then clip the values to be within the
+    # create the new locations by decomposing distance into x- and y-dim
+    # line segments (multiplied by the land's resolution-ratios, in case
+    # a non-square-resolution raster was read in), adding them to their
+    # current positions, then clipping the values to be within the
     # landscape dimensions
     # NOTE: subtract a small value to avoid having the dimension itself set
     # as a coordinate, when the coordinates are converted to np.float32
-    new_x = old_x + dist_x
-    new_x = np.clip(new_x, a_min=0, a_max=spp._land_dim[0]-0.001)
-    new_y = old_y + dist_y
-    new_y = np.clip(new_y, a_min=0, a_max=spp._land_dim[1]-0.001)
+    new_x, new_y = spp._kernels['displace'](old_x, old_y,
+                                            np.asarray(direction,
+                                                       dtype=np.float64),
+                                            np.asarray(distance,
+                                                       dtype=np.float64),
+                                            spp._land_res_ratio[0],
+                                            spp._land_res_ratio[1],
+                                            spp._land_dim[0]-0.001,
+                                            spp._land_dim[1]-0.001)
 
     # then feed the new locations into each individual's set_pos method
     [ind._set_pos(x, y) for ind, x, y in zip(spp.values(), new_x, new_y)]
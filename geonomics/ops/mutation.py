@@ -10,12 +10,72 @@ import numpy as np
 from numpy import random as r
 import random
 import re
+import os
 
 
 #------------------------------------
 # CLASSES ---------------------------
 #------------------------------------
 
+# a buffered, columnar log of the mutations that occur for a Species
+# during an iteration; rows are held in memory and appended to a CSV
+# file each time the buffer fills (and whenever _flush is called explicitly,
+# e.g. at the end of an iteration), so that no file I/O or printing
+# happens inside the mutation loop
+class _MutationLog:
+    # the columns written to the log file, in order
+    _cols = ['t', 'individ', 'locus', 'type', 'homol', 'effect_size']
+
+    def __init__(self, filepath, flush_interval=10000):
+        self.filepath = filepath
+        # number of buffered rows that triggers a flush to file
+        self.flush_interval = flush_interval
+        # columnar buffers, one list per column
+        self._buff = {col: [] for col in self._cols}
+        # start the log file with just its header
+        # NOTE: truncating any file already at the filepath (e.g. the log of
+        # an earlier run of the same model), so that flushed rows are never
+        # appended to stale rows, nor under a second header
+        dirname = os.path.dirname(self.filepath)
+        if dirname != '':
+            os.makedirs(dirname, exist_ok=True)
+        with open(self.filepath, 'w') as f:
+            f.write(','.join(self._cols) + '\n')
+
+    def __len__(self):
+        return len(self._buff['t'])
+
+    # add a row to the buffers, flushing them to file if they're full
+    def _append(self, t, individ, locus, mut_type, homol, effect_size):
+        for col, val in zip(self._cols, (t, individ, locus, mut_type,
+                                         homol, effect_size)):
+            self._buff[col].append(val)
+        if len(self) >= self.flush_interval:
+            self._flush()
+
+    # write all buffered rows to the log file, then empty the buffers
+    def _flush(self):
+        if len(self) == 0:
+            return
+        rows = zip(*[self._buff[col] for col in self._cols])
+        # NOTE: effect sizes are written at full precision;
+        # neutral mutations have an effect size of 0
+        lines = ''.join(['%i,%i,%i,%s,%i,%r\n' % (t, ind, loc, mut_type,
+                                                  homol, float(eff)) for (
+            t, ind, loc, mut_type, homol, eff) in rows])
+        with open(self.filepath, 'a') as f:
+            f.write(lines)
+        for col in self._cols:
+            self._buff[col].clear()
+
+    # read the log file (after flushing any buffered rows) into a
+    # pandas DataFrame, for post-hoc analysis
+    def _read(self):
+        import pandas as pd
+        self._flush()
+        # NOTE: parsing floats exactly, to keep the effect sizes' precision
+        return pd.read_csv(self.filepath, float_precision='round_trip')
+
 
 #--------------------------------------
 # FUNCTIONS ---------------------------
@@ -34,8 +94,16 @@ def _calc_estimated_total_mutations(spp, burn_T, T):
 def _do_add_row_muts_table(spp, individ, homol, locus):
     # update the tskit.TableCollection.mutations table
     node_id = spp[individ]._nodes_tab_ids[homol]
-    mut_id = spp._tc.mutations.add_row(site=locus, node=node_id,
-                                       derived_state='1')
+    # NOTE: if neutral mutations are being overlaid on the tables then
+    # all mutation times must be known, so give the mutation its node's time
+    # (i.e. the offspring's birth time)
+    if spp.gen_arch.overlay_neut_muts:
+        mut_id = spp._tc.mutations.add_row(site=locus, node=node_id,
+                                           derived_state='1',
+                                           time=spp._tc.nodes.time[node_id])
+    else:
+        mut_id = spp._tc.mutations.add_row(site=locus, node=node_id,
+                                           derived_state='1')
     return mut_id
 
 
@@ -63,7 +131,8 @@ def _do_neutral_mutation(spp, offspring, locus=None, individ=None):
 
     # add a row to the tskit.TableCollection.mutations table
     _do_add_row_muts_table(spp, individ, homol, locus)
-    return(individ, locus)
+    # neutral mutations have no effect size
+    return(individ, locus, homol, 0)
 
 
 # do a non-neutral mutation for a single Individual, chosen from the offspring
@@ -100,7 +169,7 @@ def _do_nonneutral_mutation(spp, offspring, locus=None, individ=None,
     _do_add_row_muts_table(spp, individ, homol, locus)
     # update the recombination subsetters
     spp.gen_arch.recombinations._update_subsetters(locus, idx)
-    return(individ, locus)
+    return(individ, locus, homol)
 
 
 # do a trait mutation for a single Individual, chosen from the offspring
@@ -110,10 +179,16 @@ def _do_trait_mutation(spp, offspring, trait_nums, alpha=None,
     #and individ (unless already provided) and update
     #the mutable_loci, neut_loci, and nonneut_loci, and 
     #change one of this locus' alleles to 1 in the mutated individual
-    individ, locus = _do_nonneutral_mutation(spp=spp, offspring=offspring,
-                                             locus=locus, individ=individ,
-                                             trait_nums=trait_nums)
-    return(individ, locus)
+    individ, locus, homol = _do_nonneutral_mutation(spp=spp,
+                                                    offspring=offspring,
+                                                    locus=locus,
+                                                    individ=individ,
+                                                    trait_nums=trait_nums)
+    #get the effect size that was drawn for the new locus
+    #(for the first of the traits, if multiple were provided)
+    trt = spp.gen_arch.traits[trait_nums[0]]
+    alpha = trt.alpha[np.where(trt.loci == locus)[0][0]]
+    return(individ, locus, homol, alpha)
 
 
 # do a deleterious mutation for a single Individual, chosen from the offspring
@@ -125,11 +200,13 @@ def _do_deleterious_mutation(spp, offspring, locus=None, s=None, individ=None):
     #(unless already provided) and update the mutable_loci, neut_loci, and 
     #nonneut_loci sets, and change one of this locus' alleles to 1 in
     #the mutated individual
-    individ, locus = _do_nonneutral_mutation(spp=spp, offspring=offspring,
-                                             locus=locus, individ=individ,
-                                             delet_s=s)
-    #return the locus and individual
-    return(individ, locus)
+    individ, locus, homol = _do_nonneutral_mutation(spp=spp,
+                                                    offspring=offspring,
+                                                    locus=locus,
+                                                    individ=individ,
+                                                    delet_s=s)
+    #return the individual, locus, homologue, and selection coefficient
+    return(individ, locus, homol, s)
 
 
 #TODO: COMPLETE THIS?
@@ -165,14 +242,12 @@ def _do_mutation(offspring, spp, log=None):
                 mut_queue.append(spp.gen_arch._planned_muts.next[1])
                 spp.gen_arch._planned_muts._set_next()
 
-        #execute all functions in the queue
+        #execute all functions in the queue, buffering a row in the
+        #mutation log for each one, if there is a log
         for i, fn in enumerate(mut_queue):
-            individ, locus = fn(spp, offspring)
-            log_msg = ('MUTATION: %s\n\t INDIVIDUAL %i,  '
-                'LOCUS %i\n\t timestep %i\n\n') % (muts[0], individ,
-                                                   locus, spp.t)
-            if log:
-                with open(log, 'a') as f:
-                    f.write(log_msg)
-            print(log_msg)
-            mut_loci_exhausted = False
+            individ, locus, homol, effect_size = fn(spp, offspring)
+            if log is not None:
+                #NOTE: planned mutations are appended after the drawn ones
+                mut_type = muts[i] if i < len(muts) else 'planned'
+                log._append(spp.t, individ, locus, mut_type, homol,
+                            effect_size)
@@ -42,23 +42,73 @@ def _calc_phenotype(ind, gen_arch, trait_num):
     return(phenotype)
 
 
-def _calc_fitness_one_trait(t, e, z, spp):
-    fit = 1 - t._get_phi(spp)*(abs((
-                e[:,t.lyr_num]**(not t.univ_adv)) - z[:,t.idx])**t.gamma)
+#Get the matrix of effect sizes (non-neutral loci x traits) and the
+#vector of null phenotypic values (one per trait) needed to calculate
+#phenotypes for all traits in one matrix product
+#NOTE: a monogenic trait's only locus gets an effect of 1 and the trait
+#gets a null value of 0, so that its phenotype is just its mean genotype,
+#whereas polygenic traits get their loci's alphas and a null value of 0.5
+#NOTE: these are cached on the GenomicArchitecture, which resets the cache
+#whenever its non-neutral loci or its traits' loci change
+def _get_trait_effects(gen_arch):
+    if gen_arch._trait_effects is not None:
+        return(gen_arch._trait_effects)
+    n_nonneut = len(gen_arch.nonneut_loci)
+    effects = np.zeros((n_nonneut, len(gen_arch.traits)))
+    nulls = np.zeros(len(gen_arch.traits))
+    for trait_num, trt in gen_arch.traits.items():
+        if trt.n_loci > 1:
+            effects[trt.loc_idx, trait_num] = trt.alpha
+            nulls[trait_num] = 0.5
+        else:
+            effects[trt.loc_idx[:1], trait_num] = 1
+    gen_arch._trait_effects = (effects, nulls)
+    return(effects, nulls)
+
+
+#Get the phenotypic values of many individuals for all traits at once,
+#given a stacked array of their non-neutral genotypes
+#(of shape N x L_n x ploidy); returns an N x n_traits array
+def _calc_phenotypes(genomes, gen_arch):
+    #get the mean genotype arrays
+    genotypes = np.mean(genomes, axis = 2)
+    #use dominance, if required (to save considerable compute time otherwise)
+    if gen_arch._use_dom:
+        #get the dominance values for the non-neutral loci
+        dom = gen_arch.dom[np.int64(gen_arch.nonneut_loci)]
+        #update the genotypes by accounting for dominance at each locus
+        genotypes = np.clip(genotypes * (1 + dom), a_min = None, a_max = 1)
+    #multiply by the effect sizes, summing across each trait's loci,
+    #and add the traits' null phenotypic values
+    effects, nulls = _get_trait_effects(gen_arch)
+    phenotypes = genotypes @ effects + nulls
+    return(phenotypes)
+
+
+def _calc_fitness_one_trait(t, e, z, spp, cells=None):
+    fit = spp._kernels['calc_trait_fitness'](e[:,t.lyr_num], z[:,t.idx],
+                                             t._get_phi(spp, cells=cells),
+                                             t.gamma, t.univ_adv)
     return(fit)
 
 
-def _calc_fitness_traits(spp, trait_num = None):
+#NOTE: e, z, and cells can be provided for a subset of the individuals
+#(as is done by the _FitnessCache), otherwise they will be gotten for all
+def _calc_fitness_traits(spp, trait_num = None, e = None, z = None,
+                         cells = None):
     traits = spp.gen_arch.traits.values()
     #subset for single trait, if indicated
     if trait_num is not None:
         traits = [list(traits)[trait_num]]
     #get all individuals' environmental values
-    e = spp._get_e()
+    if e is None:
+        e = spp._get_e()
     #get all individuals' phenotypes
-    z = spp._get_z()
+    if z is None:
+        z = spp._get_z()
     #create lambda function with current e, z, and spp objects
-    calc_fitness_lambda = lambda t: _calc_fitness_one_trait(t, e, z, spp)
+    calc_fitness_lambda = lambda t: _calc_fitness_one_trait(t, e, z, spp,
+                                                            cells = cells)
     #map the calc_sngl_trait_fitness function to all traits, then
     #calculate overall fitness as product of
     #fitness for each trait
@@ -69,15 +119,29 @@ def _calc_fitness_traits(spp, trait_num = None):
     return(fit)
 
 
-def _calc_fitness_deleterious_mutations(spp):
-    #create an np.array that has individuals in rows and their
-    #diploid genotypes for each of the deleterious loci in the cols
-    #(0, 1, or 2, to facilitate the fitness math, because s values
+def _calc_fitness_deleterious_mutations(spp, individs = None):
+    if individs is None:
+        individs = [*spp]
+    #get the sparse carriers of derived deleterious alleles (most
+    #individuals carry few) from each individual's nonzero genotypes at
+    #the deleterious loci, keyed by their row and deleterious-locus
+    #indices, so that fitness is accumulated per derived allele, rather
+    #than per locus per individual
+    #(NOTE: the flat indices of the genomes' nonzero entries are
+    #floor-divided by the ploidy to get their loci)
+    n_delet = len(spp.gen_arch.delet_loc_idx)
+    keys = np.concatenate([np.int64([])] + [row * n_delet + (np.flatnonzero(
+        spp[i].g[spp.gen_arch.delet_loc_idx, :]) // spp.gen_arch.x) for row,
+        i in enumerate(individs)])
+    #collapse each carrier's alleles at a locus into its genotype
+    #(1 or 2, to facilitate the fitness math, because s values
     #(i.e. selection coefficients) are expressed per allele)
-    deletome = np.sum(np.stack([ind.g[
-            spp.gen_arch.delet_loc_idx, :] for ind in spp.values()]), axis = 2)
-    fit = 1 - np.multiply(deletome, spp.gen_arch.delet_loci_s)
-    fit = fit.prod(axis = 1)
+    keys, genotypes = np.unique(keys, return_counts = True)
+    carriers, loci = np.divmod(keys, n_delet)
+    fit = spp._kernels['calc_deleterious_fitness'](carriers,
+                                    genotypes.astype(np.float64),
+                                    spp.gen_arch.delet_loci_s[loci],
+                                    len(individs))
     return(fit)
 
 
@@ -99,6 +163,109 @@ def _calc_fitness(spp, trait_num=None):
     return w
 
 
+#a class to cache all individuals' environmental values, phenotypes,
+#and trait- and deleterious-mutation-related fitnesses, along with masks
+#of the individuals whose environmental values ('e-dirty', e.g. after
+#movement or landscape change) or genomes ('g-dirty', e.g. after birth or
+#mutation) have changed since fitness was last calculated, so that each
+#time step only those individuals' fitnesses need be recalculated
+#NOTE: the cached arrays' rows are ordered by the individual ids in the
+#ids attribute, which is realigned to the species' current individuals
+#(dropping the dead and adding the newborn) each time fitness is updated
+class _FitnessCache:
+    def __init__(self):
+        self.ids = np.int64([])
+        self.e = None
+        self.z = None
+        self.fit_traits = np.array([])
+        self.fit_delet = np.array([])
+        self.e_dirty = np.bool_([])
+        self.g_dirty = np.bool_([])
+
+    #get the cache rows of the given individuals, and a mask indicating
+    #which of them were found in the cache
+    def _get_rows(self, individs):
+        individs = np.int64(individs)
+        if len(self.ids) == 0:
+            return(np.zeros(len(individs), dtype=np.int64),
+                   np.zeros(len(individs), dtype=np.bool_))
+        sorter = np.argsort(self.ids)
+        rows = np.searchsorted(self.ids, individs, sorter = sorter)
+        rows = sorter[np.clip(rows, a_min = 0, a_max = len(self.ids) - 1)]
+        found = self.ids[rows] == individs
+        return rows, found
+
+    #flag some or all (if individs is None) individuals' environmental
+    #values and/or genomes as having changed
+    #NOTE: individuals not yet in the cache are ignored, because they
+    #will be treated as dirty when they are first added
+    def _set_dirty(self, individs = None, e = False, g = False):
+        if individs is None:
+            rows = slice(None)
+        else:
+            rows, found = self._get_rows(individs)
+            rows = rows[found]
+        if e:
+            self.e_dirty[rows] = True
+        if g:
+            self.g_dirty[rows] = True
+
+    #realign the cache to the species' current individuals, recalculate
+    #fitness for only the dirty individuals, then return all fitnesses
+    def _update(self, spp):
+        ids = np.fromiter(spp.keys(), dtype = np.int64, count = len(spp))
+        rows, found = self._get_rows(ids)
+        carried = rows[found]
+        #survivors keep their cached values and dirty flags, whereas
+        #newly added individuals are dirty
+        e_dirty = ~found
+        e_dirty[found] = self.e_dirty[carried]
+        g_dirty = ~found
+        g_dirty[found] = self.g_dirty[carried]
+        dirty = e_dirty | g_dirty
+        fit_traits = np.ones(len(ids))
+        fit_traits[found] = self.fit_traits[carried]
+        fit_delet = np.ones(len(ids))
+        fit_delet[found] = self.fit_delet[carried]
+        use_traits = (spp.gen_arch.traits is not None
+                      and len(spp.gen_arch.traits) > 0)
+        if use_traits and dirty.any():
+            #update the e-dirty rows of the environmental values
+            #and the g-dirty rows of the phenotypes
+            e_new = np.array([spp[i].e for i in ids[e_dirty]])
+            z_new = np.array([spp[i].z for i in ids[g_dirty]])
+            e = np.zeros((len(ids), len(spp[ids[0]].e)))
+            z = np.zeros((len(ids), len(spp.gen_arch.traits)))
+            if self.e is not None:
+                e[found] = self.e[carried]
+                z[found] = self.z[carried]
+            if len(e_new) > 0:
+                e[e_dirty] = e_new
+            if len(z_new) > 0:
+                z[g_dirty] = z_new
+            fit_traits[dirty] = _calc_fitness_traits(spp, e = e[dirty],
+                                z = z[dirty], cells = spp.cells[dirty])
+        elif use_traits and self.e is not None:
+            e = self.e[carried]
+            z = self.z[carried]
+        else:
+            e = z = None
+        #deleterious fitness only depends on the genome
+        if len(spp.gen_arch.delet_loci) > 0 and g_dirty.any():
+            fit_delet[g_dirty] = _calc_fitness_deleterious_mutations(spp,
+                                                    individs = ids[g_dirty])
+        #store the realigned cache, now clean
+        self.ids = ids
+        self.e = e
+        self.z = z
+        self.fit_traits = fit_traits
+        self.fit_delet = fit_delet
+        self.e_dirty = np.zeros(len(ids), dtype = np.bool_)
+        self.g_dirty = np.zeros(len(ids), dtype = np.bool_)
+        w = fit_traits * fit_delet
+        return w
+
+
 #Get the vector of mortalities (probabilies of death) for a 
 #given density-dependent Pr(death) at a cell, the environmental value(s)
 #at that cell, the phenotype(s) of the trait(s) for the individuals found
@@ -106,8 +273,12 @@ def _calc_fitness(spp, trait_num=None):
 def _calc_prob_death(spp, d):
     #get the fitness values (while also setting all individ.fit attributes)
     w = spp._calc_fitness()
-    death_probs = 1-(1-d)*w
-    assert (death_probs >= 0).all() and (death_probs <= 1).all(), ("Some "
-                        "death-probability values outside the 0-to-1 range.")
+    death_probs = spp._kernels['calc_death_probs'](d, w)
+    #NOTE: only checked here at the 'full' validation level, because
+    #the final death probabilities are also checked at the 'cheap' level
+    #in demography._do_pop_dynamics
+    if spp._validation == 'full':
+        assert (death_probs >= 0).all() and (death_probs <= 1).all(), (
+            "Some death-probability values outside the 0-to-1 range.")
     return(death_probs)
 
@@ -8,7 +8,8 @@ Classes and functions for implementing data collection and output
 
 #geonmics imports
 from geonomics.utils.io import (_write_csv, _write_shapefile, _write_geojson,
-                                _write_file)
+                                _write_file, _open_write_file,
+                                _append_arrays_to_npz, _OutputWriter)
 
 #other imports
 import numpy as np
@@ -16,12 +17,14 @@ from random import sample as rand_sample
 from numpy import random as r
 import os, sys
 import datetime
-import re
+import tskit
+from scipy.spatial import cKDTree
 from shapely.geometry import Point
 from shapely.ops import cascaded_union
 import pandas as pd
 import geopandas as gpd
 from itertools import chain
+from copy import copy
 
 
 ######################################
@@ -38,6 +41,8 @@ class _DataCollector:
     #some lookup dicts for writing data 
         self.file_extension_dict =   {'vcf': 'vcf',
                             'fasta': 'fasta',
+                            'snapshot': 'npz',
+                            'trees': 'trees',
                             'csv': 'csv',
                             'shapefile': 'shp',
                             'geojson': 'json',
@@ -98,6 +103,10 @@ class _DataCollector:
         if sampling_params.scheme in ['transect', 'point']:
             self.pts_area = _make_point_buffers(self.pts,
                                         sampling_params.radius)
+            #and a KD-tree of the points, and the radius, to vectorize the
+            #test of which individuals fall within the buffers
+            self.radius = sampling_params.radius
+            self._pts_tree = cKDTree(np.float64(self.pts))
 
         #get the 'include_landscape' param (defaults False)
         self.include_landscape = False
@@ -147,6 +156,29 @@ class _DataCollector:
         #change the gen_formats attribute to a list if it came in as a string
         if type(self.gen_formats) == str:
             self.gen_formats = [self.gen_formats]
+        #get the 'vcf_compression' param (defaults None)
+        self.vcf_compression = None
+        if 'vcf_compression' in format_params.keys():
+            self.vcf_compression = format_params.vcf_compression
+        assert self.vcf_compression in [None, 'gzip', 'bgzf'], ("The "
+            "'vcf_compression' parameter must be one of None, 'gzip', "
+            "or 'bgzf'.")
+        #and add the compressed-file extension to VCF filenames, if needed
+        if self.vcf_compression is not None:
+            self.file_extension_dict['vcf'] = 'vcf.gz'
+        #create the writer that will run all of this DataCollector's output
+        #functions, either immediately or in a background thread (if the
+        #'write_in_background' model parameter is True; defaults False)
+        background = False
+        if 'write_in_background' in params.model.keys():
+            background = params.model.write_in_background
+        self._writer = _OutputWriter(background = background)
+
+        #create a set to hold the filepaths of the snapshot files that have
+        #been written to by this DataCollector (each of which is removed
+        #before its first append, so that it doesn't include data from
+        #a previous model run)
+        self._snapshot_filepaths = set()
         #also grab the geographic data formats as a separate attribute
         self.geo_formats = [format_params.geo_vect_format]
         #and grab the raster format, if a raster is required
@@ -175,6 +207,11 @@ class _DataCollector:
         for att_name in ['gen_formats', 'geo_formats']:
             filenames.append(['mod-%s_it-%i_t-%i_spp-%s.%s' % (self.model_name,
               iteration, self.next_t, spp_name, self.file_extension_dict[fmt])
+                        if fmt != 'snapshot' else
+                        #(snapshots from all timesteps are appended to a
+                        #single file, so it has no timestep in its name)
+                        'mod-%s_it-%i_spp-%s.%s' % (self.model_name,
+                        iteration, spp_name, self.file_extension_dict[fmt])
                         for fmt in getattr(self, att_name)])
         return(filenames)
 
@@ -215,6 +252,12 @@ class _DataCollector:
                     #sample individuals according to the scheme defined 
                     sample = self._get_sample(spp)
 
+                    #if writing in the background, snapshot the sampled
+                    #individuals (since the model will keep changing their
+                    #attributes while their data are being written)
+                    if self._writer.background:
+                        sample = {i: copy(ind) for i, ind in sample.items()}
+
                     #write files, if sample length > 0 
                     #(NOTE: otherwise, an empty file with "ZERO_SAMPLE" in the 
                     #name will be written, below)
@@ -226,16 +269,13 @@ class _DataCollector:
                             #for each genetic data format to be written
                             for n, data_format in enumerate(self.gen_formats):
 
-                                #format the data accordingly
-                                data = self._format_gen_data(
-                                    data_format = data_format, sample = sample,
-                                                                    spp = spp)
-
-                                #then write it to disk
+                                #format the data and write it to disk
                                 gen_filepath = os.path.join(subdirname,
                                                             gen_files[n])
-                                self._write_gendata(filepath = gen_filepath,
-                                                            gen_data = data)
+                                self._write_formatted_gendata(
+                                    filepath = gen_filepath,
+                                    data_format = data_format, sample = sample,
+                                                                    spp = spp)
 
                         #also write the geodata for this spp
                         for n, data_format in enumerate(self.geo_formats):
@@ -265,8 +305,16 @@ class _DataCollector:
                         self.model_name, iteration, self.next_t, lyr.name,
                                     self.file_extension_dict[self.rast_format])
                     filepath = os.path.join(dirname, filename)
+                    #snapshot the Layer and its current raster, if writing
+                    #in the background
+                    if self._writer.background:
+                        rast = lyr.rast.copy()
+                        lyr = copy(lyr)
+                        lyr._cube = None
+                        lyr.rast = rast
                     #and write it to disk
-                    lyr._write_raster(filepath, self.rast_format)
+                    self._writer._submit(lyr._write_raster, filepath,
+                                         self.rast_format)
 
             #update self.next_t to the next timestep to be sampled
             self._set_next_t()
@@ -281,9 +329,22 @@ class _DataCollector:
 
 
     def _get_point_sample(self, spp):
-        #TODO: check if this should be sped up any more
-        sample = [i for i,v in spp.items() if self.pts_area.contains(
-                                                        Point(v.x, v.y))]
+        if len(spp) == 0:
+            return []
+        #get each individual's distance to its nearest sampling point
+        idxs = np.array([*spp])
+        dists, _ = self._pts_tree.query(spp._get_coords())
+        #individuals closer than the buffers' inner radius (i.e. the
+        #radius of the circle inscribed in their polygons) are definitely
+        #within the buffers, and those at least the radius away are
+        #definitely not, so only test the rest against the buffers' polygons
+        #(such that the results are identical to testing all individuals)
+        in_sample = dists < self.radius * _BUFFER_INNER_RADIUS_RATIO
+        to_test = np.where((~in_sample) * (dists < self.radius))[0]
+        for i in to_test:
+            ind = spp[idxs[i]]
+            in_sample[i] = self.pts_area.contains(Point(ind.x, ind.y))
+        sample = idxs[in_sample].tolist()
         if len(sample) > self.n:
             sample = self._get_random_sample(individuals = sample)
         return(sample)
@@ -311,27 +372,52 @@ class _DataCollector:
         return(sample)
 
 
-    def _format_gen_data(self, data_format, sample, spp):
+    def _write_formatted_gendata(self, filepath, data_format, sample, spp):
         '''<data_format> can be:
                             'fasta'
                             'vcf'
+                            'snapshot'
+                            'trees'
         '''
+        #NOTE: the data each format needs are gathered here, but then are
+        #formatted and written by self._writer (which may do so in the
+        #background, so the data passed to it must not be changed later)
+        #dump the sample's tree sequence, which needs no decoded genotypes
+        if data_format == 'trees':
+            tc, nodes = _get_sample_tables(sample, spp)
+            self._writer._submit(_dump_trees, filepath, tc, nodes)
+            return
         genotypes = spp._get_genotypes(individs=[*sample], as_dict=True)
         if data_format == 'fasta':
-            formatted_data = _format_fasta(sample, genotypes)
+            #stream the FASTA to disk
+            self._writer._submit(_stream_to_file, filepath, _write_fasta,
+                                 sample, genotypes)
         elif data_format == 'vcf':
-            formatted_data = _format_vcf(sample, genotypes, spp.gen_arch,
-                    include_fixed_sites = self.include_fixed_sites)
-        return(formatted_data)
+            #stream the VCF to disk, compressing it if requested
+            self._writer._submit(_stream_to_file, filepath, _write_vcf,
+                sample, genotypes, spp.gen_arch,
+                include_fixed_sites = self.include_fixed_sites,
+                compression = self.vcf_compression)
+        elif data_format == 'snapshot':
+            #remove any snapshot file left from a previous model run,
+            #before first appending to it
+            if filepath not in self._snapshot_filepaths:
+                if os.path.isfile(filepath):
+                    os.remove(filepath)
+                self._snapshot_filepaths.add(filepath)
+            arrays = _make_snapshot_arrays(sample, genotypes, spp.gen_arch)
+            self._writer._submit(_append_arrays_to_npz, filepath,
+                                 't-%i' % self.next_t, arrays)
 
 
     def _write_gendata(self, filepath, gen_data):
-        _write_file(filepath, gen_data)
+        self._writer._submit(_write_file, filepath, gen_data)
 
 
     def _write_geodata(self, filepath, data_format, sample):
         write_fn = self.write_geodata_fn_dict[data_format]
-        write_fn(filepath = filepath, individuals = sample)
+        self._writer._submit(write_fn, filepath = filepath,
+                             individuals = sample)
 
 
 ######################################
@@ -347,6 +433,12 @@ def _get_transect_points(endpoints, n):
     return(list(zip(x_pts, y_pts)))
 
 
+#the ratio of the inner radius of a shapely point buffer (a polygon with
+#4 * 16 segments, by default, whose vertices lie on the buffer's radius) to
+#its radius, with a small tolerance, for floating-point error
+_BUFFER_INNER_RADIUS_RATIO = np.cos(np.pi / 64) * (1 - 1e-9)
+
+
 #a function to make shapely geometry buffers around a set of points
 def _make_point_buffers(points, radius):
     pts = [Point(*p) for p in points]
@@ -355,8 +447,124 @@ def _make_point_buffers(points, radius):
     return(cu)
 
 
-def _format_fasta(sample, genotypes):
+def _make_snapshot_arrays(sample, genotypes, gen_arch):
+    '''
+    Make the dict of arrays for a binary snapshot of the sample, to be
+    appended to a snapshot file (an uncompressed NPZ file) as a group of
+    arrays named 't-<t>/<array_name>'. The file can be read with np.load,
+    or with geonomics.utils.io._read_snapshots, which memory-maps the arrays.
+
+    SNAPSHOT ARRAYS:
+
+    idx, x, y, age, sex, fit:   N-length arrays of individuals' attributes
+                                (with fit being NaN if not yet calculated)
+    e:                          N x n_layers array of environmental values
+    z:                          N x n_traits array of phenotypes
+    genotypes:                  N x L x ploidy np.int8 array of genotypes
+    nonneut_loci, delet_loci,
+    delet_loci_s:               non-neutral loci, deleterious loci, and
+                                deleterious loci's selection coefficients
+    trait_<n>_loci,
+    trait_<n>_alpha:            each trait's loci and their effect sizes
+    '''
+    # ensure that sample and genotypes have identical lenghts and orders
+    assert len(sample) == len(genotypes), ("'sample', and 'genotypes' have"
+                                           "different lenghts!")
+    assert np.all([*sample] == [*genotypes]), ("'sample' and 'genotypes' do not"
+                                               " have identical orders!")
+    individs = [*sample.values()]
+    arrays = {'idx': np.int64([ind.idx for ind in individs]),
+              'x': np.float64([ind.x for ind in individs]),
+              'y': np.float64([ind.y for ind in individs]),
+              'age': np.int64([ind.age for ind in individs]),
+              'sex': np.int8([ind.sex for ind in individs]),
+              'fit': np.float64([np.nan if ind.fit is None else (
+                                            ind.fit) for ind in individs]),
+              'e': np.float64([ind.e for ind in individs]).reshape(
+                                                        (len(individs), -1)),
+              'z': np.float64([ind.z for ind in individs]).reshape(
+                                                        (len(individs), -1)),
+              'genotypes': np.stack([*genotypes.values()]).astype(np.int8),
+              'nonneut_loci': np.asarray(gen_arch.nonneut_loci,
+                                         dtype=np.int64),
+              'delet_loci': np.asarray(gen_arch.delet_loci, dtype=np.int64),
+              'delet_loci_s': np.asarray(gen_arch.delet_loci_s,
+                                         dtype=np.float64),
+             }
+    if gen_arch.traits is not None:
+        for trt_num, trt in gen_arch.traits.items():
+            arrays['trait_%i_loci' % trt_num] = np.asarray(trt.loci,
+                                                           dtype=np.int64)
+            arrays['trait_%i_alpha' % trt_num] = np.asarray(trt.alpha,
+                                                            dtype=np.float64)
+    return arrays
+
+
+def _get_sample_tables(sample, spp):
+    '''
+    Get a copy of the species' tskit tables and the sampled individuals'
+    nodes, to be simplified to those nodes and dumped to a .trees file
+    (by _dump_trees).
+
+    As in the species' own tables, each individual's 'location' column holds
+    its x and y coordinates, followed by its phenotypes and fitness (if the
+    species has traits); but the sampled individuals' values are updated to
+    their values at the sampling timestep (rather than at birth).
+    '''
+    # sort and simplify the species' tables, so that all individuals'
+    # nodes- and individuals-table ids are current
+    spp._sort_simplify_table_collection()
+    tc = spp._tc.copy()
+    # update the sampled individuals' locations (and phenotypes and fitness)
+    locs = tskit.unpack_arrays(tc.individuals.location,
+                               tc.individuals.location_offset)
+    # (NOTE: getting table ids from the species, because the sample may hold
+    # snapshots of the individuals, taken before the tables were simplified)
+    for idx, ind in sample.items():
+        loc = [ind.x, ind.y]
+        if spp.gen_arch.traits is not None:
+            loc = loc + ind.z + [np.nan if ind.fit is None else ind.fit]
+        locs[spp[idx]._individuals_tab_id] = np.float64(loc)
+    tc.individuals.packset_location(locs)
+    nodes = spp._get_nodes(individs=[*sample])
+    return tc, nodes
+
+
+# simplify a copy of a species' tskit tables to the given nodes,
+# then dump the tree sequence to a .trees file
+# (NOTE: sites are not filtered, so that site ids match locus indices)
+def _dump_trees(filepath, tc, nodes):
+    tc.simplify(nodes, filter_individuals=True, filter_sites=False)
+    tc.tree_sequence().dump(filepath)
+
+
+# open a file (optionally compressed) and stream data to it
+# using the given write function
+def _stream_to_file(filepath, write_fn, *args, compression=None, **kwargs):
+    with _open_write_file(filepath, compression) as f:
+        write_fn(f, *args, **kwargs)
+
+
+# a translation table from the bytes of a genotype array's alleles
+# (i.e. 0 and 1, as np.int8) to their ASCII characters
+_FASTA_BASE_TABLE = bytes.maketrans(bytes(range(10)), b'0123456789')
+
+
+# format an individual's attribute as a FASTA header field
+# (with multiple values, e.g. of phenotype and environment, separated by '|')
+def _format_fasta_field(val):
+    if isinstance(val, (list, tuple, np.ndarray)):
+        field = '|'.join([str(v) for v in val])
+    else:
+        field = str(val)
+    return field
+
+
+def _write_fasta(f, sample, genotypes):
     '''
+    Stream a FASTA of the sample's haplotypes to f (a file object opened
+    for binary writing).
+
     FASTA FORMAT:
 
     >idx:haploid_num|x_location|y_location|phenotype0;phenotype1;...;
@@ -370,26 +578,34 @@ def _format_fasta(sample, genotypes):
     assert np.all([*sample] == [*genotypes]), ("'sample' and 'genotypes' do not"
                                                " have identical orders!")
 
-    row1 = '>%s:HAP;%s;%s;%s;%s;%s;%s\n'
-    file_text = ''
-
     for individ, genotype in zip(sample.values(), genotypes.values()):
-        for hap in range(2):
-            individ_row1 = re.sub('HAP', str(hap), row1)
-            replace = tuple(map(lambda att: re.sub(',', '|', re.sub('[\[\] ]',
-                '', str(getattr(individ, att)))), ['idx', 'x', 'y', 'age',
-                                            'sex', 'z', 'e']))
-            individ_row1 = individ_row1 % replace
-            individ_row2 = ''.join([str(
-                            base) for base in genotype[:,hap]]) + '\n'
+        #format the individual's header fields once, for all its haplotypes
+        fields = ';'.join([_format_fasta_field(getattr(individ,
+                att)) for att in ['x', 'y', 'age', 'sex', 'z', 'e']])
+        #get the haplotypes as contiguous rows, to write their bytes directly
+        haps = np.ascontiguousarray(genotype.T, dtype=np.int8)
+        for hap in range(haps.shape[0]):
+            f.write(('>%s:%i;%s\n' % (individ.idx, hap, fields)).encode())
+            f.write(haps[hap].tobytes().translate(_FASTA_BASE_TABLE))
+            f.write(b'\n')
 
-            file_text = file_text + individ_row1 + individ_row2
 
-    return(file_text)
+# the genotype-column strings for each biallelic diploid genotype code
+# (i.e. 2 * allele_0 + allele_1), as a table of bytes, such that a whole
+# block of genotypes can be formatted at once by indexing into it
+_VCF_GT_TABLE = np.frombuffer(b'0|0\t0|1\t1|0\t1|1\t',
+                              dtype=np.uint8).reshape((4, 4))
 
+# the approximate number of genotype-column bytes to format per chunk
+# of VCF rows
+_VCF_CHUNK_BYTES = 2**24
 
-def _format_vcf(sample, genotypes, gen_arch, include_fixed_sites=False):
 
+def _write_vcf(f, sample, genotypes, gen_arch, include_fixed_sites=False):
+    '''
+    Stream a VCF of the sample's genotypes to f (a file object opened for
+    binary writing), formatting and writing chunks of rows at a time.
+    '''
     # ensure that sample and genotypes have identical lenghts and orders
     assert len(sample) == len(genotypes), ("'sample', and 'genotypes' have"
                                            "different lenghts!")
@@ -413,63 +629,56 @@ def _format_vcf(sample, genotypes, gen_arch, include_fixed_sites=False):
         #NOTE: this has 1 string slot for a tab-separated
         #list of all individ ids
 
-    #template data row
+    #template data-row prefix (i.e. all columns before the genotypes)
     #TODO: UPDATE/CHANGE THE INFO AND FORMAT PORTIONS OF THIS TEMPLATE,
     #AFTER I DECIDE ON THEIR CONTENTS (above)
-    data_row = ('%i\t%i\t.\tA\tT\t1000\tPASS\t%s\tGT\t%s\n')
+    data_row_prefix = '%i\t%i\t.\tA\tT\t1000\tPASS\t%s\tGT\t'
         #NOTE: this has 2 integer slots, then 1 string slot for:
             #- chrom number (NOTE: unpythonically, starts from 1)
             #- locus number (NOTE: reported cumulative from locus 0,
                #not from start of each chrom)
-            #- a tab-separated list of individs' genotypes at this locus
+            #- an indicator of whether the site is segregating or fixed
 
-    #create a col_header_row for this data
+    #get the date
+    now = datetime.datetime.now()
+    month = str(now.month).zfill(2)
+    day = str(now.day).zfill(2)
+    date = '%d%s%s' % (now.year, month, day)
+
+    #write the header and the col_header_row for this data
     inds = [*sample.keys()]
     ind_cols = '\t'.join([str(i) for i in inds])
-    cols = col_header_row % (ind_cols)
-
-    #get a list of the chromosome numbers
-    #chroms = np.cumsum(gen_arch.l_c)
+    f.write((header % date + col_header_row % (ind_cols)).encode())
 
-    #and get all individuals' genomic data in a 'samplome' object (a 3-d array)
-    samplome = np.array([genotypes[i] for i in inds])
-
-    #get all segregating sites
+    #get all segregating sites (accumulating allele counts across
+    #individuals, rather than stacking all genotypes into one array)
     max_val = 2 * len(sample)
-    segs = np.where(samplome.sum(axis = 2).sum(axis = 0) > 0)[0]
-    segs2 = np.where(samplome.sum(axis = 2).sum(axis = 0) < max_val)[0]
-    segs = sorted(list(set(segs).intersection(set(segs2))))
+    counts = np.zeros(gen_arch.L, dtype=np.int64)
+    for gt in genotypes.values():
+        counts += gt.sum(axis=1)
+    seg = (counts > 0) * (counts < max_val)
 
-    #if not_include_fixed_sites, include only the segregating sites in the VCF 
+    #if not_include_fixed_sites, include only the segregating sites in the VCF
     if not include_fixed_sites:
-        loci = segs
+        loci = np.where(seg)[0]
     #or else get all loci
     else:
-        loci = range(gen_arch.L)
-
-    #and get the sites' chrom nums
-    #chroms = [list((locus - chroms) < 0).index(True) for locus in loci]
-
-    #build all the VCF data rows
-    rows = ''
-    for n, locus in enumerate(loci):
-        gts = samplome[:,locus,:]
-        gts = '\t'.join(['%i|%i' % (gts[i,0],
-                gts[i,1]) for i in range(np.shape(gts)[0])])
-        #get an indicator for whether the site is segregating or fixed
-        seg = locus in segs
-        seg_dict = {True: 'SEG', False: 'FIX'}
-
-        rows = rows + data_row % (0, locus, seg_dict[seg], gts)
-
-    #get the date
-    now = datetime.datetime.now()
-    month = str(now.month).zfill(2)
-    day = str(now.day).zfill(2)
-    date = '%d%s%s' % (now.year, month, day)
-
-    #paste all the VCF content together
-    out_vcf = ''.join([header % date, cols, rows])
-
-    #return it
-    return(out_vcf)
+        loci = np.arange(gen_arch.L)
+
+    #format and write the rows, a chunk of loci at a time
+    seg_dict = {True: 'SEG', False: 'FIX'}
+    chunk_size = max(1, _VCF_CHUNK_BYTES // (4 * len(inds)))
+    for chunk_start in range(0, len(loci), chunk_size):
+        chunk_loci = loci[chunk_start: chunk_start + chunk_size]
+        #get the chunk's genotypes as an n_loci x n_individs array of codes
+        codes = np.stack([2 * genotypes[i][chunk_loci, 0] +
+                          genotypes[i][chunk_loci, 1] for i in inds], axis=1)
+        #then look up their genotype strings, and end each row with a newline
+        gts = _VCF_GT_TABLE[codes]
+        gts[:, -1, 3] = ord('\n')
+        rows = []
+        for locus, row_gts in zip(chunk_loci, gts):
+            rows.append((data_row_prefix % (0, locus,
+                                            seg_dict[seg[locus]])).encode())
+            rows.append(row_gts.tobytes())
+        f.write(b''.join(rows))
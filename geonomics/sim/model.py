@@ -12,6 +12,7 @@ from geonomics.structs.landscape import _make_landscape
 from geonomics.structs.community import _make_community
 from geonomics.sim.data import _DataCollector
 from geonomics.sim.stats import _StatsCollector
+from geonomics.ops.mutation import _MutationLog
 from geonomics.utils._str_repr_ import _get_str_spacing
 from geonomics.utils.viz import _check_display
 
@@ -104,6 +105,20 @@ class Model:
         # (will only be used if there are genomes in any species)
         self._tskit_simp_interval = m_params.tskit_simp_interval
 
+        # get the backend for the per-timestep numerical kernels
+        # ('numpy' or 'numba'; defaults to 'numpy')
+        self._kernel_backend = 'numpy'
+        if 'kernel_backend' in m_params.keys():
+            self._kernel_backend = m_params.kernel_backend
+
+        # get the level of runtime validation checks to run each timestep
+        # ('off', 'cheap', or 'full'; defaults to 'cheap')
+        self._validation = 'cheap'
+        if 'validation' in m_params.keys():
+            self._validation = m_params.validation
+        assert self._validation in ['off', 'cheap', 'full'], ("The "
+            "'validation' parameter must be one of 'off', 'cheap', or 'full'.")
+
         #get the number of model iterations to run
         self.n_its = m_params.its.n_its
         #set the its list
@@ -369,6 +384,11 @@ class Model:
     #wrapper around Land._make_change
     def _make_land_change(self):
         self.land._make_change(t = self.t, verbose = self._verbose)
+        #then notify all species of the lyrs that changed at this timestep
+        #(if any), so that they update only the dependent attributes
+        changed_lyrs = self.land._pop_changed_lyrs()
+        for spp in self.comm.values():
+            spp._notify_land_change(self.land, changed_lyrs)
 
     #wrapper around Species._make_change
     def _make_spp_change(self, spp_idx):
@@ -422,6 +442,10 @@ class Model:
     def _make_community(self, verbose=False):
         comm = _make_community(self.land, self.params, burn=True,
                                verbose=verbose)
+        #set the species' numerical kernels' backend and validation level
+        for spp in comm.values():
+            spp._set_kernels(self._kernel_backend)
+            spp._validation = self._validation
         return(comm)
 
     #a method to reset the community (recopying or regenerating as necessary)
@@ -508,6 +532,10 @@ class Model:
         #set the self.reassign_genomes attribute
         self._set_reassign_genomes()
 
+        #finish writing any output still being written in the background
+        #by the previous iteration's data and stats collectors
+        self._flush_output_writers()
+
         #reset the self._data_collector attribute (the data._DataCollector
         #object) if necessary
         if self._data_collector is not None:
@@ -518,6 +546,9 @@ class Model:
         if self._stats_collector is not None:
             self._reset_stats_collector()
 
+        #make new mutation logs for any species that should keep them
+        self._make_mut_logs()
+
         #create new main fn queue (and burn fn queue, if needed)
         if repeat_burn or self.it <= 0:
             #verbose output
@@ -530,6 +561,44 @@ class Model:
         self.main_fn_queue = self._make_fn_queue(burn=False)
 
 
+    #method to make a new mutation log (an ops.mutation._MutationLog) for
+    #each species whose mut_log parameter is set, for the current iteration
+    #(a str value is used as the log's filepath, with the iteration number
+    #appended; otherwise the log is saved in the model's output directory)
+    def _make_mut_logs(self):
+        for spp in self.comm.values():
+            #flush the previous iteration's log, if it wasn't already
+            if spp._mut_log is not None:
+                spp._mut_log._flush()
+                spp._mut_log = None
+            if spp.mut_log:
+                if isinstance(spp.mut_log, str):
+                    root, ext = os.path.splitext(spp.mut_log)
+                    filepath = '%s_it-%i%s' % (root, self.it, ext or '.csv')
+                else:
+                    filepath = os.path.join('GNX_mod-%s' % self.name,
+                                            'it-%i' % self.it,
+                                            'spp-%s' % spp.name,
+                                            'mod-%s_it-%i_spp-%s_mut_log.csv' % (
+                                                self.name, self.it, spp.name))
+                spp._mut_log = _MutationLog(filepath)
+
+
+    #method to write any buffered mutation-log rows to file
+    def _flush_mut_logs(self):
+        for spp in self.comm.values():
+            if spp._mut_log is not None:
+                spp._mut_log._flush()
+
+
+    #method to wait for any data and stats output still being written
+    #in the background (if the 'write_in_background' parameter is True)
+    def _flush_output_writers(self):
+        for collector in [self._data_collector, self._stats_collector]:
+            if collector is not None:
+                collector._writer._flush()
+
+
     #method to create the simulation functionality, as a function queue 
     #NOTE: (creates the list of functions that will be run by
     #self.run_burn_timestep or self.run_main_timestep,
@@ -573,14 +642,11 @@ class Model:
         #_DataCollector or _StatsCollector objects (in the self._data_collector 
         #and self._stats_collector attributes)
         if not burn:
-            #add land._make_change method
+            #add land._make_change method (which will also update all
+            #Species' K rasters and environmental values, but only at
+            #timesteps when the Layers they're based on have changed)
             if self.land._changer is not None:
                 queue.append(self._make_land_change)
-                #add Species._set_K methods (which will update all Species' K
-                #rasters, in case landscape change has changed the Layers
-                #they're based on
-                for spp in self.comm.values():
-                    queue.append(lambda: self._set_K(spp.idx, self.land))
             #add spp._make_change methods
             for spp in self.comm.values():
                 if spp._changer is not None:
@@ -762,6 +828,11 @@ class Model:
             if extinct:
                 break
 
+        #write out anything still buffered in the mutation logs
+        self._flush_mut_logs()
+        #and finish writing any data and stats output
+        self._flush_output_writers()
+
 
         ##################
         # public methods #
@@ -1061,6 +1132,10 @@ class Model:
             # end the iteration early if any species is extinct
             if extinct:
                 break
+        # write out anything still buffered in the mutation logs
+        self._flush_mut_logs()
+        # and finish writing any data and stats output
+        self._flush_output_writers()
         # reset self._verbose to False
         self._verbose = old_verbose
 
@@ -78,6 +78,8 @@ params = {
             'ulc':                      (0,0),
             #projection of the Landscape
             'prj':                      None,
+            #file to back the Landscape's raster cube with (via np.memmap)
+            'memmap_filepath':          None,
             }, # <END> 'main'
 
     #--------------#
@@ -130,6 +132,12 @@ params = {
         'num':          None,
         #time step interval for simplication of tskit tables
         'tskit_simp_interval':      100,
+        #backend for the per-timestep numerical kernels {'numpy', 'numba'}
+        'kernel_backend':           'numpy',
+        #level of runtime validation checks {'off', 'cheap', 'full'}
+        'validation':               'cheap',
+        #whether to write data and stats output in a background thread
+        'write_in_background':      False,
 
 %s
 %s
@@ -205,6 +213,10 @@ FILE_LYR_PARAMS = '''
                         'coord_prec':                   5,
                         #units of this file's variable
                         'units':                        None,
+                        #bounding box to read (xmin, ymin, xmax, ymax)
+                        'window':                       None,
+                        #resolution (x,y) to which to resample the file
+                        'target_res':                   None,
 
                         }, # <END> 'file'
 '''
@@ -225,6 +237,19 @@ NLMPY_LYR_PARAMS = '''
                         }, # <END> 'nlmpy'
 '''
 
+#the block of spectral-layer parameters
+SPECTRAL_LYR_PARAMS = '''
+                    #parameters for a 'spectral'-type Layer
+                    'spectral': {
+                        #correlation length (in cells) of the random field
+                        'corr_len':                     5,
+                        #number of habitat types to quantize to (None for a
+                        #continuous Layer)
+                        'num_hab_types':                None,
+
+                        }, # <END> 'spectral'
+'''
+
 #block of layer-change parameters
 #STRING SLOTS:
     #%i = lyr_num,
@@ -327,6 +352,12 @@ SPP_PARAMS = '''
                     'd_max':                        1,
                     #width of window used to estimate local pop density
                     'density_grid_window_width':    None,
+                    #density estimator {'grid', 'gaussian', 'box'}
+                    'density_estimator':            'grid',
+                    #whether to calc demographic rasters only on occupied tiles
+                    'tiled_demography':             False,
+                    #factor by which to coarsen the demographic rasters
+                    'demography_coarsening_factor': 1,
                     }, # <END> 'mortality'
 
             #---------------------------------------#
@@ -406,8 +437,12 @@ GENOME_PARAMS = '''
                     'start_p_fixed':            0.5,
                     #whether to start neutral locus freqs at 0
                     'start_neut_zero':          False,
+                    #whether to recapitate starting ancestry only when needed
+                    'recapitate':               False,
                     #genome-wide per-base neutral mut rate (0 to disable)
                     'mu_neut':                  0,
+                    #whether to overlay neutral muts post hoc using msprime
+                    'overlay_neut_muts':        False,
                     #genome-wide per-base deleterious mut rate (0 to disable)
                     'mu_delet':                 0,
                     #shape of distr of deleterious effect sizes
@@ -615,8 +650,10 @@ DATA_PARAMS = '''
                 'include_fixed_sites':  False,
                 },
             'format': {
-                #format for genetic data {'vcf', 'fasta'}
+                #format for genetic data {'vcf', 'fasta', 'snapshot', 'trees'}
                 'gen_format':           ['vcf', 'fasta'],
+                #compression for VCF files {None, 'gzip', 'bgzf'}
+                'vcf_compression':      None,
                 #format for vector geodata {'csv', 'shapefile', 'geojson'}
                 'geo_vect_format':      'csv',
                 #format for raster geodata {'geotiff', 'txt'}
@@ -757,15 +794,16 @@ def _make_lyrs_params_str(lyrs=1):
                                       'defined': DEFINED_LYR_PARAMS,
                                       'file': FILE_LYR_PARAMS,
                                       'nlmpy': NLMPY_LYR_PARAMS,
+                                      'spectral': SPECTRAL_LYR_PARAMS,
                                      }
         #for each lyr
         for i, lyr_dict in enumerate(lyrs):
             #assert that the 'type' value is valid
             if 'type' in [*lyr_dict]:
                 assert lyr_dict['type'] in ['random', 'defined', 'file',
-                    'nlmpy'], ("The value provided for the 'type' of Layer "
-                    "%i is invalid. Valid values include: ['random', "
-                    "'defined', 'file', 'nlmpy'].") % i
+                    'nlmpy', 'spectral'], ("The value provided for the 'type' "
+                    "of Layer %i is invalid. Valid values include: ['random', "
+                    "'defined', 'file', 'nlmpy', 'spectral'].") % i
                 #get the type params for this lyr
                 lyr_type = lyr_dict['type']
             else:
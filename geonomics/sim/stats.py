@@ -8,7 +8,8 @@ Classes and functons to implement calculation and output of statistics
 
 #geonomics imports
 from geonomics.utils.io import (_append_array2d_to_array_stack,
-                                _append_row_to_csv, _write_dict_to_csv)
+                                _append_row_to_csv, _write_dict_to_csv,
+                                _OutputWriter)
 from geonomics.ops.selection import _calc_fitness
 from geonomics.utils.viz import _check_display
 
@@ -68,6 +69,14 @@ class _StatsCollector:
                                 'mean_fit': 'OTHER_STATS.csv',
                                  }
 
+        #create the writer that will run all of this StatsCollector's output
+        #functions, either immediately or in a background thread (if the
+        #'write_in_background' model parameter is True; defaults False)
+        background = False
+        if 'write_in_background' in params.model.keys():
+            background = params.model.write_in_background
+        self._writer = _OutputWriter(background = background)
+
         #get the species names
         spps_with_wout_genomes = {str(k):('gen_arch' in v.keys()) for k, v
                                  in params.comm.species.items()}
@@ -186,12 +195,14 @@ class _StatsCollector:
         for spp, spp_stats in self.stats.items():
             #get a dictionary of the data values for all stats that are to be
             #written just once at the end of the iteration
-            data_dict = {k:v['vals'] for k,v in spp_stats.items() if
+            #(copying the lists of values, which could otherwise be extended
+            #while being written in the background)
+            data_dict = {k:[*v['vals']] for k,v in spp_stats.items() if
                               'OTHER_STATS' in v['filepath']}
             #they all have the same filepath, so just grab the first
             filepath = [*spp_stats.values()][0]['filepath']
             #write to disk
-            _write_dict_to_csv(filepath, data_dict)
+            self._writer._submit(_write_dict_to_csv, filepath, data_dict)
 
     #method to write stats to files, in the appropriate directory (by model
     #and iteration number), and with the appropriate spp names in the filenames
@@ -212,7 +223,8 @@ class _StatsCollector:
                     #get the correct write_fn for this stat
                     write_fn = self.write_fn_dict[stat]
                     #call the write_fn to write the data to disk
-                    write_fn(filepath, stat_dict['vals'][t], t)
+                    self._writer._submit(write_fn, filepath,
+                                         stat_dict['vals'][t], t)
                     #then replace the last data collected prior to this
                     #timestep's data with None, to free up memory but still
                     #maintain the latest data in case of plotting
@@ -336,11 +336,15 @@ class Trait:
         self.loc_idx = np.int64([])
         self.alpha = np.array([])
 
-    def _get_phi(self, spp):
+    #NOTE: cells can be provided to get phi for only a subset of the
+    #species' individuals
+    def _get_phi(self, spp, cells=None):
+        if cells is None:
+            cells = spp.cells
         if type(self.phi) in (float, int):
-            phi = np.array([self.phi]*len(spp))
+            phi = np.array([self.phi]*len(cells))
         else:
-            phi = self.phi[spp.cells[:, 1], spp.cells[:, 0]]
+            phi = self.phi[cells[:, 1], cells[:, 0]]
         return(phi)
 
     def _set_loci(self, loci):
@@ -447,6 +451,11 @@ class GenomicArchitecture:
             A 1d numpy array that tracks all loci that do not influence the
             phenotypes of any traits.
 
+        overlay_neut_muts:
+            A bool indicating whether neutral mutations should be left out of
+            the forward-time simulation and instead overlaid on the Species'
+            tree sequence (using msprime) whenever it is sorted and simplified
+
         nonneut_loci:
             A 1d numpy array that tracks all loci that either influence the
             phenotype of at least one trait or are deleterious.
@@ -455,6 +464,12 @@ class GenomicArchitecture:
             Starting allele frequencies for all loci (stored as an L-length,
             1d numpy array)
 
+        recapitate:
+            A bool indicating whether the starting population's genomes
+            should be founded as unrelated nodes, with their coalescent
+            ancestry only simulated (by recapitation, using msprime) if and
+            when lineages are requested, rather than simulated up front
+
         pleiotropy:
             A bool indicating whether or not to allow pleiotropy (i.e. whether
             or not to allow the same locus to subtend multiple traits)
@@ -499,9 +514,17 @@ class GenomicArchitecture:
         self._use_dom = np.any(self.dom)
         # whether or not to use sexes for this species
         self.sex = g_params.sex
+        # whether to recapitate the starting population's ancestry only
+        # when needed, rather than simulating it before the main phase
+        self.recapitate = ('recapitate' in g_params.keys()
+                           and g_params.recapitate is True)
 
         # genome-wide neutral mutation rate
         self.mu_neut = g_params.mu_neut
+        # whether neutral mutations should be overlaid on the tree sequence
+        # after the fact, rather than simulated forward in time
+        self.overlay_neut_muts = ('overlay_neut_muts' in g_params.keys()
+                                  and g_params.overlay_neut_muts is True)
         # array to keep track of all loci that don't influence the
         # phenotypes of any trait; defaults to all loci, then will be updated
         self.neut_loci = np.array(range(self.L))
@@ -525,6 +548,10 @@ class GenomicArchitecture:
         self.traits = None
         if 'traits' in [*g_params]:
             self.traits = _make_traits(g_params.traits, land)
+        # cache for the traits' effect-size matrix and null phenotypes
+        # (set by ops.selection._get_trait_effects; reset to None whenever
+        # the non-neutral or trait loci change)
+        self._trait_effects = None
 
         # set self._mu_tot, the total per-site, per-generation mutation rate
         mus = [mu for mu in (self.mu_neut, self.mu_delet) if mu is not None]
@@ -533,6 +560,10 @@ class GenomicArchitecture:
         self._mu_tot = sum(mus)
         # save the nonneutral mutation rate
         self._mu_nonneut = self._mu_tot - self.mu_neut
+        # and drop the neutral rate from the total forward-time rate,
+        # if neutral mutations will instead be overlaid after the fact
+        if self.overlay_neut_muts:
+            self._mu_tot = self._mu_nonneut
 
         # set a placeholder for the species' mutable loci
         # (to be filled after burn-in)
@@ -558,7 +589,7 @@ class GenomicArchitecture:
     # for each type of mutation for this species
     def _make_mut_fns_dict(self):
         mut_fns = {}
-        if self.mu_neut > 0:
+        if self.mu_neut > 0 and not self.overlay_neut_muts:
             def neut_fn(spp, offspring):
                 return(mutation._do_neutral_mutation(spp, offspring))
             mut_fns.update({'neut': neut_fn})
@@ -578,7 +609,7 @@ class GenomicArchitecture:
     # method to draw mutation types for any number of mutations chosen
     # to occur in a given timestep
     def _draw_mut_types(self, num):
-        type_dict = {'neut': self.mu_neut,
+        type_dict = {'neut': self.mu_neut * (not self.overlay_neut_muts),
                      'delet': self.mu_delet}
         if self.traits is not None:
             trait_dict = {'t%i' % (k): v.mu for k, v in self.traits.items()}
@@ -625,6 +656,8 @@ class GenomicArchitecture:
     # method for assigning loci to traits
     def _set_trait_loci(self, trait_num, mutational=False,
                         loci=None, alpha=None):
+        # the cached trait effects will need to be rebuilt
+        self._trait_effects = None
         # if this is not the result of a point mutation, but instead
         # either an initial setup or manually introduced, then grab the
         # number of loci to be assigned
@@ -681,6 +714,8 @@ class GenomicArchitecture:
     # NOTE: either trait_nums or delet_s must be non-None,
     # and trait_nums must be iterable (if not None)
     def _add_nonneut_locus(self, locus, trait_nums=None, delet_s=None):
+        # the cached trait effects will need to be rebuilt
+        self._trait_effects = None
         # remove from the neut_loci array
         self.neut_loci = np.delete(self.neut_loci,
                                    np.where(self.neut_loci == locus))
@@ -715,6 +750,15 @@ class GenomicArchitecture:
         else:
             assert True == False, "BOTH TRAITS_NUMS AND DELET_S CANT BE NONE!"
 
+        # reset all other traits' and deleterious loci's genotype-array
+        # indices, because all those after the new locus have been bumped
+        # down by its insertion
+        if self.traits is not None:
+            for trt in self.traits.values():
+                trt._set_loc_idx(self.nonneut_loci)
+        self.delet_loc_idx = np.searchsorted(self.nonneut_loci,
+                                             self.delet_loci)
+
         return idx
 
 
@@ -996,10 +1040,24 @@ def _check_mutation_rates(gen_arch, est_tot_muts, burn_T, T):
         mutables = [*set(range(gen_arch.L)).difference(
                                             set(gen_arch.nonneut_loci))]
         r.shuffle(mutables)
+        # if neutral mutations will be overlaid after the fact then only
+        # reserve as many mutable loci as the (over)estimated number of
+        # forward-time mutations, leaving the rest of the neutral loci
+        # as targets for the neutral overlay
+        if gen_arch.overlay_neut_muts:
+            mutables = mutables[:est_tot_muts]
         gen_arch._mutables = [*mutables]
     return
 
 
+# get the loci that are targets for the post-hoc neutral-mutation overlay
+# (i.e. all neutral loci not reserved for forward-time mutations)
+def _get_neut_overlay_loci(gen_arch):
+    if gen_arch._mutables is None:
+        return gen_arch.neut_loci
+    return np.setdiff1d(gen_arch.neut_loci, gen_arch._mutables)
+
+
 # function to generate mutations, after burn-in,
 # and to assign them to a species' TableCollection's  current nodes,
 # to produce the starting 1-allele frequencies parameterized for the species
@@ -1038,7 +1096,7 @@ def _make_starting_mutations(spp, tables):
 
     # and then reset the individuals' phenotypes, if needed
     if spp.gen_arch.traits is not None:
-        [ind._set_z(spp.gen_arch) for ind in spp.values()]
+        spp._set_z()
 
     return
 
@@ -10,7 +10,7 @@ functions
 
 #geonomics imports
 from geonomics.ops.movement import _do_dispersal
-from geonomics.ops.selection import _calc_phenotype
+from geonomics.ops.selection import _calc_phenotypes
 
 #other imports
 import numpy as np
@@ -90,7 +90,8 @@ class Individual:
 
 
     """
-    def __init__(self, idx, x, y, age=0, new_genome=None, sex=None):
+    def __init__(self, idx, x, y, age=0, new_genome=None, sex=None,
+                 validate=True):
         self.idx = idx
         #individual's x-ploid genome (NOTE: make np.int8 to minimize mem)
         if new_genome is not None:
@@ -116,12 +117,15 @@ class Individual:
         self._individuals_tab_id = None
         self._nodes_tab_ids = {}
 
-        assert type(self.x) == float and self.x >= 0, ("invalid value "
+        # check the attributes' types and values, unless the Species'
+        # validation level is below 'full'
+        if validate:
+            assert type(self.x) == float and self.x >= 0, ("invalid value "
                                 "for x: %s, %s") % (str(self.x), type(self.x))
-        assert type(self.y) == float and self.y >= 0, ("invalid value "
+            assert type(self.y) == float and self.y >= 0, ("invalid value "
                                 "for y: %s, %s") % (str(self.y), type(self.y))
-        assert self.sex == None or self.sex in [0,1]
-        assert type(self.age) == int
+            assert self.sex == None or self.sex in [0,1]
+            assert type(self.age) == int
 
 
     #####################
@@ -143,8 +147,8 @@ class Individual:
 
     # set the individual's phenotype (attribute z) for all traits
     def _set_z(self, genomic_architecture):
-        self.z = [_calc_phenotype(self, genomic_architecture,
-            trait_num) for trait_num in genomic_architecture.traits]
+        self.z = [*_calc_phenotypes(self.g[np.newaxis],
+                                    genomic_architecture)[0]]
 
     # set the individual's fitness
     def _set_fit(self, fit):
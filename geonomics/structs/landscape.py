@@ -65,7 +65,9 @@ class Layer:
 
         rast:
             The 2d numpy array, of shape `Landscape.dim`, containing the
-            environmental values for this Layer.
+            environmental values for this Layer. (Once the Layer belongs to
+            a Landscape, this is a view into the Landscape's stacked
+            raster cube, and setting it writes into that cube.)
 
         res:
             The x,y (i.e. lon,lat; or i,j in array terms) spatial resolution
@@ -75,7 +77,7 @@ class Layer:
 
         type:
             A string indicating the type of the Layer ('random', 'defined',
-            'file', or 'nlmpy')
+            'file', 'nlmpy', or 'spectral')
 
         ulc: 
             The x,y (i.e. lon,lat; or i,j in array terms) coordinates of the
@@ -113,6 +115,15 @@ class Layer:
         # Landscape is instantiated
         self._x_cell_bds = None
         self._y_cell_bds = None
+        # the Landscape's stacked raster cube, and this Layer's index in it
+        # (to be set when a Landscape is instantiated)
+        self._cube = None
+        self._cube_idx = None
+        # the window and target resolution with which the Layer's raster
+        # (and any file-based change rasters) are read from file, if any
+        # (to be set for 'file' Layers)
+        self._window = None
+        self._target_res = None
         self.rast = rast
         assert type(self.rast) == np.ndarray, "rast should be a numpy.ndarray"
         self._scale_min = scale_min
@@ -123,6 +134,29 @@ class Layer:
         self._is_K = []
 
 
+    #get the Layer's raster (from the Landscape's stacked raster cube,
+    #if the Layer has been stacked into one)
+    @property
+    def rast(self):
+        if self._cube is None:
+            return self._rast
+        return self._cube[self._cube_idx]
+
+    #set the Layer's raster (writing it into the Landscape's stacked
+    #raster cube, if the Layer has been stacked into one, after explicitly
+    #casting it to the cube's dtype, which raises a TypeError rather than
+    #e.g. silently truncating float values into an integer cube)
+    @rast.setter
+    def rast(self, rast):
+        if self._cube is None:
+            self._rast = rast
+        else:
+            rast = np.asarray(rast).astype(self._cube.dtype,
+                                           casting = 'same_kind',
+                                           copy = False)
+            self._cube[self._cube_idx] = rast
+
+
     #####################
     ### OTHER METHODS ###
     #####################
@@ -222,6 +256,12 @@ class Landscape(dict):
         n_lyrs:
             The number of Layers in the Landscape
 
+        _cube:
+            A 3d numpy array (or numpy.memmap), of shape
+            (n_lyrs, Landscape.dim[1], Landscape.dim[0]), stacking all of the
+            Layers' rasters (in the order of the Landscape's Layers), such
+            that all Layers can be sampled with a single fancy-index
+
         prj:
             The projection of the Layer (formatted as a PROJ4 string).
             (Must be the same as the Landscape to which the Layer belongs.)
@@ -242,7 +282,8 @@ class Landscape(dict):
     ### SPECIAL METHODS ###
     #######################
 
-    def __init__(self, lyrs, res=(1,1), ulc=(0,0), prj=None, mod=None):
+    def __init__(self, lyrs, res=(1,1), ulc=(0,0), prj=None, mod=None,
+                 memmap_filepath=None):
         #check the lyrs dict is correct, then update the Landscape with it
         assert False not in [
             lyr.__class__.__name__ == 'Layer' for lyr in lyrs.values(
@@ -308,10 +349,17 @@ class Landscape(dict):
             assert np.all(lyr.rast <= 1), ("Layer '%s' contains values "
                                            "greater than 1.") %(lyr.name)
 
+        #stack all of the lyrs' rasters into a single raster cube
+        self._cube = None
+        self._stack_layers(memmap_filepath = memmap_filepath)
 
         #create a changer attribute (defaults to None, but will later be set
         #to an ops.change.LandscapeChanger object if params call for it)
         self._changer = None
+        #create a set to track the numbers of the lyrs that have changed
+        #since it was last emptied (so that only the Species attributes
+        #that depend on those lyrs need to be updated)
+        self._changed_lyrs = set()
 
     #define the __str__ and __repr__ special methods
     #NOTE: this doesn't excellently fit the Python docs' specification for 
@@ -352,6 +400,50 @@ class Landscape(dict):
     #method to set a raster
     def _set_raster(self, lyr_num, rast):
         self[lyr_num].rast = rast
+        self._changed_lyrs.add(lyr_num)
+
+    #method to get the set of lyrs that have changed since this method
+    #was last called (and then to empty it)
+    def _pop_changed_lyrs(self):
+        changed_lyrs = self._changed_lyrs
+        self._changed_lyrs = set()
+        return changed_lyrs
+
+    #method to stack all of the lyrs' rasters into a single (n_lyrs, H, W)
+    #raster cube (with each lyr's raster becoming a view into the cube),
+    #optionally backed by a memory-mapped file (which can then be opened
+    #read-only, e.g. by worker processes running parallel iterations,
+    #using np.memmap(memmap_filepath, dtype=land._cube.dtype, mode='r',
+    #shape=land._cube.shape))
+    #NOTE: once written, the memmapped cube is reopened copy-on-write, so
+    #that any later changes to the lyrs' rasters (e.g. landscape changes)
+    #are held in this process' memory, and the shared file is never modified
+    def _stack_layers(self, memmap_filepath=None):
+        rasts = [lyr.rast for lyr in self.values()]
+        #NOTE: using the lyrs' common dtype, so that their values are
+        #unchanged by stacking
+        dtype = np.result_type(*rasts)
+        shape = (len(rasts), *rasts[0].shape)
+        if memmap_filepath is None:
+            cube = np.empty(shape, dtype = dtype)
+        else:
+            cube = np.memmap(memmap_filepath, dtype = dtype, mode = 'w+',
+                             shape = shape)
+        for i, rast in enumerate(rasts):
+            cube[i] = rast
+        if memmap_filepath is not None:
+            cube.flush()
+            cube = np.memmap(memmap_filepath, dtype = dtype, mode = 'c',
+                             shape = shape)
+        self._cube = cube
+        for i, lyr in enumerate(self.values()):
+            lyr._cube = cube
+            lyr._cube_idx = i
+
+    #method to get the values of all lyrs at the given cells
+    #(as an (n_cells, n_lyrs) array)
+    def _get_values(self, cells_x, cells_y):
+        return self._cube[:, cells_y, cells_x].T
 
     #method to set all lyrs' res and ulc attributes
     def _set_lyrs_res_ulc_prj(self):
@@ -518,6 +610,42 @@ def _make_defined_lyr(dim, rast, pts, vals, interp_method="cubic",
     return I
 
 
+def _make_spectral_lyr(dim, corr_len, num_hab_types=None):
+    # generates a Gaussian random field by spectral synthesis: white noise
+    #is transformed to the frequency domain, multiplied by the spectrum of a
+    #Gaussian kernel with standard deviation corr_len (in cells), then
+    #transformed back, so runtime is ~O(n log n) in the number of cells,
+    #rather than growing with the number of interpolated points (as for the
+    #'random' layer type)
+    assert corr_len >= 0, ("The 'corr_len' parameter of a 'spectral' "
+        "Layer must be a non-negative number.")
+    assert num_hab_types is None or (isinstance(num_hab_types, int)
+                                     and num_hab_types >= 2), ("The "
+        "'num_hab_types' parameter of a 'spectral' Layer must be either None "
+        "or an int >= 2.")
+    # NOTE: the noise is generated on a grid padded by 3 correlation lengths
+    #on each side, then cropped, so that the periodic wrap-around of the FFT
+    #doesn't correlate opposite edges of the layer
+    pad = int(np.ceil(3 * corr_len))
+    shape = (dim[0] + (2 * pad), dim[1] + (2 * pad))
+    noise = r.normal(size=shape)
+    freq_i = np.fft.fftfreq(shape[0])
+    freq_j = np.fft.rfftfreq(shape[1])
+    filt = np.exp(-2 * (np.pi * corr_len)**2 * (freq_i[:, None]**2 +
+                                                freq_j[None, :]**2))
+    I = np.fft.irfft2(np.fft.rfft2(noise) * filt, s=shape)
+    I = I[pad:pad + dim[0], pad:pad + dim[1]]
+    # transform to uniformly distributed values, 0 < val < 1, by rank
+    ranks = np.empty(I.size)
+    ranks[np.argsort(I, axis=None)] = np.arange(I.size)
+    I = ((ranks + 0.5) / I.size).reshape(I.shape)
+    # quantize into equal-area habitat classes, if requested
+    #(with class values evenly spaced from 0 to 1)
+    if num_hab_types is not None:
+        I = np.floor(I * num_hab_types) / (num_hab_types - 1)
+    return I
+
+
 def _make_landscape(mod, params, num_hab_types=2, verbose=False):
     #print verbose output
     if verbose:
@@ -536,6 +664,10 @@ def _make_landscape(mod, params, num_hab_types=2, verbose=False):
     #leave default projection as None for now
     if prj is None:
         prj = None
+    #get the filepath for a memory-mapped raster cube, if provided
+    memmap_filepath = None
+    if 'memmap_filepath' in params.landscape.main.keys():
+        memmap_filepath = params.landscape.main.memmap_filepath
 
     #create a dictionary to hold all the lyrs to be created
     lyrs = {}
@@ -550,7 +682,9 @@ def _make_landscape(mod, params, num_hab_types=2, verbose=False):
                        'scale_min_vals': [],
                        'scale_max_vals': [],
                        'coord_precs': [],
-                       'unitss': []}
+                       'unitss': [],
+                       'windows': [],
+                       'target_ress': []}
 
     #then loop over the lyrs in params.landscape.lyrs and create each one
     for n, (lyr_name, lyr_params) in enumerate(
@@ -560,19 +694,21 @@ def _make_landscape(mod, params, num_hab_types=2, verbose=False):
         init_params = deepcopy(lyr_params.init)
 
         #determine which type of lyr this is to be
-        #(valid: 'random', 'defined', 'file')
+        #(valid: 'random', 'defined', 'file', 'nlmpy', 'spectral')
         init_keys = [*init_params]
         if len(init_keys) > 1:
             raise ValueError(("The %ith layer (params['land']['layers'] "
                 "key '%s') appears to have parameters for more than one layer "
                 "type.  Choose a single layer type (valid values: 'random', "
-                "'defined', 'file', 'nlmpy') and provide a sub-dictionary "
+                "'defined', 'file', 'nlmpy', 'spectral') and provide a sub-dictionary "
                 "of parameters for only that type.") % (n, str(k)))
         lyr_type = init_keys[0]
-        assert lyr_type in ['random', 'defined', 'file', 'nlmpy'], ("The "
+        assert lyr_type in ['random', 'defined', 'file', 'nlmpy',
+                            'spectral'], ("The "
             "parameters sub-dictionary for the %ith layer (params['land']"
             "['layers'] key '%s') has an invalid key value. Valid keys are: "
-            "'random', 'defined', 'file'.") % (n, str(k))
+            "'random', 'defined', 'file', 'nlmpy', 'spectral'.") % (n,
+                                                                    str(k))
 
         #create a random lyr, if called for
         if lyr_type == 'random':
@@ -590,6 +726,12 @@ def _make_landscape(mod, params, num_hab_types=2, verbose=False):
             lyrs[n] = Layer(lyr_rast, lyr_type = lyr_type,
                 name = lyr_name, dim = dim, res = res, ulc = ulc)
 
+        #or else create a spectral lyr
+        elif lyr_type == 'spectral':
+            lyr_rast = _make_spectral_lyr(dim, **init_params[lyr_type])
+            lyrs[n] = Layer(lyr_rast, lyr_type = lyr_type,
+                name = lyr_name, dim = dim, res = res, ulc = ulc)
+
         #or else create an nlmpy lyr
         elif lyr_type == 'nlmpy':
             #get the params
@@ -619,6 +761,11 @@ def _make_landscape(mod, params, num_hab_types=2, verbose=False):
             file_lyr_params['names'].append(lyr_name)
             [file_lyr_params[k+'s'].append(v) for k,v in init_params[
                                                         lyr_type].items()]
+            #(defaulting to reading the full file at its native resolution,
+            #if no window or target resolution is provided)
+            for k in ['window', 'target_res']:
+                if k not in init_params[lyr_type].keys():
+                    file_lyr_params[k+'s'].append(None)
 
     #now set the necessary layers to their file rasters, if applicable
     if True in [len(v) > 0 for v in file_lyr_params.values()]:
@@ -642,7 +789,8 @@ def _make_landscape(mod, params, num_hab_types=2, verbose=False):
                                     file_lyr_params['coord_precs'])]
 
     #create the land object
-    land = Landscape(lyrs, res=res, ulc=ulc, prj=prj, mod=mod)
+    land = Landscape(lyrs, res=res, ulc=ulc, prj=prj, mod=mod,
+                     memmap_filepath=memmap_filepath)
 
     # set all Layers' cell-bounds attributes
     [setattr(lyr, '_x_cell_bds', land._x_cell_bds) for lyr in land.values()]
@@ -671,7 +819,8 @@ def _make_landscape(mod, params, num_hab_types=2, verbose=False):
 
 
 def _get_file_rasters(land_dim, names, lyr_nums, filepaths, coord_precs,
-                      scale_min_vals, scale_max_vals, unitss):
+                      scale_min_vals, scale_max_vals, unitss, windows,
+                      target_ress):
     assert len(lyr_nums)==len(filepaths), ('Parameters provide a '
                                            'different number of GIS raster '
                                            'files to read in than of layer '
@@ -683,12 +832,15 @@ def _get_file_rasters(land_dim, names, lyr_nums, filepaths, coord_precs,
     lyrs = []
     for n,filepath in enumerate(filepaths):
         #get array, dim, res, ulc, and prj from io.read_raster
+        #(reading only the window and resolution requested, if any)
         rast_array, rast_dim, rast_res, rast_ulc, rast_prj = _read_raster(
-            filepath, coord_precs[n], land_dim)
+            filepath, coord_precs[n], land_dim, window=windows[n],
+            target_res=target_ress[n])
         #check that the dimensions are right
         assert rast_dim == land_dim, ('Variable land_dim and the dimensions '
             'of the input raster %s appear to differ. Please clip %s to '
-            'the correct dimensions and try again, because it has x,y '
+            'the correct dimensions (or provide a window and/or target '
+            'resolution that yield them) and try again, because it has x,y '
             'dimensions (%i, %i), but land has x,y '
             'dimensions (%i,%i)') % (filepath,
             filepath, rast_dim[0], rast_dim[1], land_dim[0], land_dim[1])
@@ -737,6 +889,11 @@ def _get_file_rasters(land_dim, names, lyr_nums, filepaths, coord_precs,
                  units=units) for lyr_num, name,
             rast, scale_min, scale_max, units in zip(lyr_nums, names, rasters,
             scale_min_vals, scale_max_vals, unitss)]
+    #store the window and target resolution each lyr was read with, so
+    #that its change rasters can be read the same way
+    for lyr, window, target_res in zip(lyrs, windows, target_ress):
+        lyr._window = window
+        lyr._target_res = target_res
     return(lyrs, res, ulc, prj)
 
 
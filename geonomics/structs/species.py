@@ -12,6 +12,7 @@ from geonomics.utils import viz, spatial as spt
 from geonomics.structs.genome import (_make_genomic_architecture,
                                       _check_mutation_rates,
                                       _make_starting_mutations,
+                                      _get_neut_overlay_loci,
                                       _get_lineage_dicts,
                                       _get_lineage_dicts_one_tree,
                                       _get_treenums,
@@ -20,7 +21,9 @@ from geonomics.structs.landscape import Layer
 from geonomics.structs.individual import Individual, _make_individual
 from geonomics.ops.movement import _do_movement, _do_dispersal
 from geonomics.ops.mating import _find_mates, _draw_n_births, _do_mating
-from geonomics.ops.selection import _calc_fitness
+from geonomics.ops.selection import (_calc_fitness, _calc_phenotypes,
+                                     _FitnessCache)
+from geonomics.ops.kernels import _get_kernels
 from geonomics.ops.mutation import (_do_mutation,
                                     _calc_estimated_total_mutations)
 from geonomics.ops.demography import _do_pop_dynamics, _calc_logistic_soln
@@ -130,6 +133,11 @@ class Species(OD):
             The minimum probability of death that can be assigned to any
             Individual
 
+        density_estimator:
+            A string indicating which estimator the Species'
+            _DensityGridStack object uses to estimate the Species'
+            population-density array ('grid', 'gaussian', or 'box')
+
         density_grid_window_width:
             The width of the sliding window that is used by the Species'
             _DensityGridStack object when estimating the Species'
@@ -302,6 +310,16 @@ class Species(OD):
             (such that a Species with t == 999 has been run for 1000 time
             steps).
 
+        tiled_demography:
+            A bool flag indicating whether or not the demographic rasters
+            should only be calculated on the Landscape tiles occupied by (or
+            adjacent to tiles occupied by) Individuals
+
+        demography_coarsening_factor:
+            The integer factor by which the Landscape's resolution is
+            coarsened for the calculation of the demographic rasters
+            (1 meaning that they are calculated at the Landscape's resolution)
+
     """
     #######################
     ### SPECIAL METHODS ###
@@ -420,6 +438,19 @@ class Species(OD):
                 if section == 'movement':
                     if spp_params[section].move:
                         self._move = True
+        #default to untiled demography at the landscape's resolution,
+        #if not set in the params
+        if not hasattr(self._pv, 'tiled_demography'):
+            self._pv.tiled_demography = False
+        if not hasattr(self._pv, 'demography_coarsening_factor'):
+            self._pv.demography_coarsening_factor = 1
+        #and default to the grid-based density estimator
+        if not hasattr(self._pv, 'density_estimator'):
+            self._pv.density_estimator = 'grid'
+        assert (type(self.demography_coarsening_factor) is int
+            and self.demography_coarsening_factor >= 1), ("The "
+            "'demography_coarsening_factor' parameter must be a positive "
+            "integer.")
 
         #if sex is True and repro_age is an int or float, coerce to a tuple
         #(one val for each sex)
@@ -441,12 +472,38 @@ class Species(OD):
         else:
             self._tc = None
             self._tc_sorted_and_simplified = None
+        # whether or not the TableCollection has been recapitated
+        # (only used if gen_arch.recapitate is True)
+        self._recapitated = None
+        # the node time back to which neutral mutations have already
+        # been overlaid on the TableCollection (only used if
+        # gen_arch.overlay_neut_muts is True; set once genomes are assigned)
+        self._neut_overlay_time = None
 
         #set the selection attribute, to indicate whether or not
         #natural selection should be implemented for the species
         self.selection = (self.gen_arch is not None and
             (self.gen_arch.mu_delet > 0 or self.gen_arch.traits is not None))
 
+        #create the selection._FitnessCache object, which caches
+        #individuals' environmental values, phenotypes, and fitnesses, so
+        #that fitness need only be recalculated for individuals whose
+        #environmental values or genomes have changed since last calculated
+        if self.gen_arch is not None:
+            self._fit_cache = _FitnessCache()
+        else:
+            self._fit_cache = None
+
+        #set the dict of numerical kernels to be used by the per-timestep
+        #operations (defaults to the NumPy backend, but will be reset by the
+        #Model according to its 'kernel_backend' parameter)
+        self._kernels = _get_kernels()
+
+        #set the level of runtime validation checks to run each timestep
+        #('off', 'cheap', or 'full'; defaults to 'full', but will be reset
+        #by the Model according to its 'validation' parameter)
+        self._validation = 'full'
+
         #set the self.mutate attribute (a boolean indicating whether
         #or not to enact mutation, which is True if gen_arch._mu_tot > 0
         self.mutate = (self.gen_arch is not None
@@ -458,6 +515,10 @@ class Species(OD):
         self.mut_log = None
         if 'gen_arch' in [*spp_params]:
             self.mut_log = spp_params.gen_arch.mut_log
+        #and the attribute that will hold the ops.mutation._MutationLog
+        #object that buffers and writes the log (set by the Model
+        #at the start of each iteration, if self.mut_log is not False/None)
+        self._mut_log = None
 
         #create a coord attrgetter function,
         #for use in getting all individs' coordinates
@@ -531,6 +592,36 @@ class Species(OD):
             raise AttributeError("The Species has no attribute %s" % attr)
 
 
+    #the current species density raster, which (if the species uses
+    #coarsened demography, and thus has only had its coarsened density
+    #raster set) is only refined to the landscape's resolution when needed
+    @property
+    def N(self):
+        if self._N is None and self._N_coarse is not None:
+            self._N = spt._refine_raster(self._N_coarse,
+                                         self.demography_coarsening_factor,
+                                         self._dens_grids.land_gi.shape)
+        return self._N
+
+    @N.setter
+    def N(self, N):
+        self._N = N
+        self._N_coarse = None
+
+    #the local carrying capacity raster, which clears the cached coarsened
+    #K raster whenever it is set (including by in-place arithmetic, e.g.
+    #during demographic change), so that coarsened demography only
+    #recoarsens it after it changes
+    @property
+    def K(self):
+        return self._K
+
+    @K.setter
+    def K(self, K):
+        self._K = K
+        self._K_coarse = None
+
+
     #####################
     ### OTHER METHODS ###
     #####################
@@ -543,9 +634,35 @@ class Species(OD):
     def _set_K(self, land):
         self.K = land[self.K_layer].rast * self.K_factor
 
+    #method to update only the attributes that depend on the given set of
+    #changed Landscape lyrs (i.e. the K raster, if its lyr changed, and the
+    #individuals' environmental values, which also flags their fitnesses
+    #for recalculation), so that nothing is recomputed on timesteps
+    #without landscape change
+    def _notify_land_change(self, land, changed_lyrs):
+        if len(changed_lyrs) == 0:
+            return
+        if self.K_layer in changed_lyrs:
+            self._set_K(land)
+        self._set_e(land)
+
+    #method to get the K raster coarsened by the species'
+    #demography_coarsening_factor (cached until K is next set)
+    def _get_K_coarse(self):
+        if self._K_coarse is None:
+            self._K_coarse = spt._coarsen_raster(self.K,
+                                        self.demography_coarsening_factor)
+        return self._K_coarse
+
     #method to set self.N
-    def _set_N(self, N):  #NOTE: Requires a landscape.Layer instance
-        self.N = N
+    #NOTE: if coarse is True then N is the coarsened density raster, and
+    #will only be refined to the landscape's resolution when self.N is read
+    def _set_N(self, N, coarse = False):  #NOTE: Requires a landscape.Layer instance
+        if coarse:
+            self.N = None
+            self._N_coarse = N
+        else:
+            self.N = N
 
     #method to append current spp size to the spp.Nt list
     def _set_Nt(self):
@@ -627,6 +744,15 @@ class Species(OD):
             genomes_and_segs = _do_mating(self, mating_pairs,
                                           n_births, recomb_keys)
 
+            # calculate all of the offspring's phenotypes at once, in the same
+            # order in which the offspring will be created below
+            if self.gen_arch.traits is not None and total_births > 0:
+                offspring_z = _calc_phenotypes(np.stack([
+                    genome_and_segs[0] for pair_genomes_and_segs in (
+                    genomes_and_segs) for genome_and_segs in (
+                    pair_genomes_and_segs)]), self.gen_arch)
+                offspring_z = [*offspring_z[::-1]]
+
         for n_pair, pair in enumerate(mating_pairs):
 
             parent_midpoint_x = (self[pair[0]].x + self[pair[1]].x)/2
@@ -667,7 +793,8 @@ class Species(OD):
                 self[offspring_key] = Individual(idx=offspring_key, age=age,
                                                  new_genome=new_genome,
                                                  x=offspring_x, y=offspring_y,
-                                                 sex=sex)
+                                                 sex=sex, validate=(
+                                            self._validation == 'full'))
 
                 #set new individual's phenotype (won't be set
                 #during burn-in, because no genomes assigned;
@@ -675,7 +802,7 @@ class Species(OD):
                 if (self.gen_arch is not None
                     and self.gen_arch.traits is not None
                     and not burn):
-                    self[offspring_key]._set_z(self.gen_arch)
+                    self[offspring_key].z = [*offspring_z.pop()]
 
                 # during the main phase, for species with genomes,
                 # update the tskit tables
@@ -727,13 +854,16 @@ class Species(OD):
                         genome_segs) for seg in [*seg_set]]
 
 
-        # sample all individuals' environment values, to initiate for offspring
-        self._set_e(land)
+        # sample the offspring's environment values
+        # NOTE: all other individuals' values are already current, because
+        # they are resampled after movement and after landscape changes
+        if len(keys_list) > 0:
+            self._set_e(land, individs=keys_list)
         self._set_coords_and_cells()
 
         # do mutation if necessary
         if self.mutate and not burn:
-             _do_mutation(keys_list, self, log = self.mut_log)
+             _do_mutation(keys_list, self, log = self._mut_log)
 
 
     #method to do species dynamics
@@ -745,7 +875,8 @@ class Species(OD):
         #then carry out the pop-dynamics, with selection as set above, and save
         #result, which will be True iff spp has gone extinct
         extinct = _do_pop_dynamics(self, land,
-            with_selection = with_selection, burn = burn)
+            with_selection = with_selection, burn = burn,
+            validation = self._validation)
         if extinct:
             #set self.extinct equal to True, so that the iteration will end
             self.extinct = extinct
@@ -810,6 +941,7 @@ class Species(OD):
             [ind._set_g(np.zeros(
                 (len(self.gen_arch.nonneut_loci),
                     self.gen_arch.x))) for ind in self.values()]
+            self._set_fit_cache_dirty(g=True)
 
     # add new row to the individuals' numpy arrays, for a given mutation locus
     def _add_new_locus(self, idx, locus):
@@ -823,18 +955,43 @@ class Species(OD):
         else:
             ig = itemgetter(*individs)
             inds_to_set = ig(self)
-            if isinstance(inds_to_set, individual.Individual):
+            if isinstance(inds_to_set, Individual):
                 inds_to_set = (inds_to_set,)
-        hab = [ind._set_e([lyr.rast[int(ind.y), int(
-            ind.x)] for lyr in land.values()]) for ind in inds_to_set]
+        #get all lyrs' values at all of the individuals' cells
+        #with a single fancy-index into the Landscape's raster cube
+        cells = np.int64(np.float64([*map(self._coord_attrgetter,
+                                          inds_to_set)]).reshape((-1, 2)))
+        e = land._get_values(cells[:, 0], cells[:, 1])
+        [ind._set_e([*e_ind]) for ind, e_ind in zip(inds_to_set, e)]
+        self._set_fit_cache_dirty(individs=individs, e=True)
 
     #method to set the individuals' phenotype attributes 
-    def _set_z(self):
-        [ind._set_z(self.gen_arch) for ind in self.values()];
+    def _set_z(self, individs=None):
+        self._set_fit_cache_dirty(individs=individs, g=True)
+        if self.gen_arch.traits is None or len(self) == 0:
+            return
+        if individs is None:
+            individs = [*self]
+        # calculate all the individuals' phenotypes at once
+        zs = _calc_phenotypes(np.stack([self[i].g for i in individs]),
+                              self.gen_arch)
+        for i, z in zip(individs, zs):
+            self[i].z = [*z]
 
     #method for setting an individual's phenotype
     def _set_z_individ(self, individ):
         self[individ]._set_z(self.gen_arch)
+        self._set_fit_cache_dirty(individs=[individ], g=True)
+
+    #method to flag some or all individuals' environmental values and/or
+    #genomes as changed, so that their fitnesses will be recalculated
+    def _set_fit_cache_dirty(self, individs=None, e=False, g=False):
+        if self._fit_cache is not None:
+            self._fit_cache._set_dirty(individs=individs, e=e, g=g)
+
+    #method to set the numerical kernels' backend ('numpy' or 'numba')
+    def _set_kernels(self, backend):
+        self._kernels = _get_kernels(backend)
 
     #method to set the individuals' fitness attributes
     def _set_fit(self, fit):
@@ -853,7 +1010,10 @@ class Species(OD):
     #method to set the species' spatial._DensityGridStack attribute
     def _set_dens_grids(self, land, widow_width = None):
         self._dens_grids = spt._DensityGridStack(land = land,
-                                window_width = self.density_grid_window_width)
+                                window_width = self.density_grid_window_width,
+                                coarsening_factor = (
+                                    self.demography_coarsening_factor),
+                                estimator = self.density_estimator)
 
 
     # method to set the species' genomes, check for adequate mutable loci,
@@ -873,15 +1033,34 @@ class Species(OD):
         # check whether there are adequate mutable loci for this species
         _check_mutation_rates(self.gen_arch, est_tot_muts, burn_T, T)
 
-        # simulate a coalescent ancestry with number of samples equal to our
-        # species' number of haploid genomes (i.e. 2*N_0)
-        ts = msprime.simulate(len(self) * 2, Ne=1000, length=self.gen_arch.L)
+        # if the starting population's ancestry will be recapitated later on
+        # then just start with a TableCollection containing one unrelated
+        # node for each of our species' haploid genomes (i.e. 2*N_0)
+        # NOTE: the nodes are placed in population 0, which msprime
+        # requires in order to recapitate (and the time units and population
+        # metadata are set the way msprime expects them)
+        if self.gen_arch.recapitate:
+            tables = tskit.TableCollection(sequence_length=self.gen_arch.L)
+            tables.time_units = 'generations'
+            tables.populations.metadata_schema = (
+                                    tskit.MetadataSchema.permissive_json())
+            tables.populations.add_row(metadata={'name': 'pop_0',
+                                                 'description': ''})
+            for _ in range(len(self) * self.gen_arch.x):
+                tables.nodes.add_row(flags=1, time=0, population=0)
+            self._recapitated = False
+
+        # otherwise, simulate a coalescent ancestry with number of samples
+        # equal to our species' number of haploid genomes (i.e. 2*N_0)
+        else:
+            ts = msprime.simulate(len(self) * 2, Ne=1000,
+                                  length=self.gen_arch.L)
 
-        # then grab the simulation's tree, and the tree's TableCollection
-        # NOTE: the TreeSequence object only has one tree,
-        # because no recombination was used in the sim
-        tree = ts.first()
-        tables = ts.dump_tables()
+            # then grab the simulation's tree, and the tree's TableCollection
+            # NOTE: the TreeSequence object only has one tree,
+            # because no recombination was used in the sim
+            tree = ts.first()
+            tables = ts.dump_tables()
 
         # set the sequence length
         #tables.sequence_length = self.gen_arch.L
@@ -982,9 +1161,78 @@ class Species(OD):
 
         # assign as the species' TableCollection
         self._tc = tables
+
+        # starting individuals' nodes are at time 1, so any neutral overlay
+        # will cover all branches from there forward
+        # (and the starting mutations need known times, because the overlay
+        # will give known times to all mutations)
+        # (NOTE: computing them requires the tables to be indexed, which the
+        # founder tables built for recapitation are not; they have no edges,
+        # so they are already sorted)
+        if self.gen_arch.overlay_neut_muts:
+            self._neut_overlay_time = 1
+            self._tc.build_index()
+            self._tc.compute_mutation_times()
         return
 
 
+    # method to recapitate the TableCollection (i.e. to use msprime to
+    # simulate the coalescent ancestry of the starting population's unrelated
+    # founder nodes, just as would otherwise have been done before the main
+    # phase), if the species uses recapitation and it has not yet been done
+    # NOTE: this is only needed for lineages, because the founders'
+    # starting mutations sit on the founder nodes themselves,
+    # so genotypes are the same with or without recapitation
+    def _recapitate_table_collection(self):
+        if not self.gen_arch.recapitate or self._recapitated:
+            return
+        # sort and simplify the TableCollection, if needed
+        if not self._tc_sorted_and_simplified:
+            self._sort_simplify_table_collection()
+        # NOTE: the founders' nodes are all at time 1, and msprime preserves
+        # all existing node ids, so individuals' node ids stay valid
+        # NOTE: starting the simulation at the founders' time, because
+        # simplification can drop founder nodes that became unary, leaving
+        # their starting mutations (at time 1) on younger roots, and so
+        # the ancestors simulated above those roots must be older than 1
+        # NOTE: seeding from numpy, so that runs remain reproducible
+        ts = msprime.sim_ancestry(initial_state=self._tc,
+                                  population_size=1000,
+                                  recombination_rate=0,
+                                  start_time=1,
+                                  random_seed=r.randint(1, 2**31 - 1))
+        self._tc = ts.dump_tables()
+        self._recapitated = True
+
+
+    # method to overlay neutral mutations (using msprime) on the branches of
+    # the simplified TableCollection that fall between the current timestep
+    # and the last time this was called (or the start of the main phase),
+    # to be used instead of forward-time neutral mutation
+    # NOTE: nodes' times are -t, for the timestep t in which they were born,
+    # so the new overlay spans node times [-t, self._neut_overlay_time)
+    def _overlay_neutral_mutations(self):
+        start_time = -self.t
+        if (self._neut_overlay_time is None
+            or start_time >= self._neut_overlay_time
+            or self.gen_arch.mu_neut == 0):
+            return
+        # set the neutral rate at the overlay's target loci, 0 elsewhere
+        rates = np.zeros(self.gen_arch.L)
+        rates[_get_neut_overlay_loci(self.gen_arch)] = self.gen_arch.mu_neut
+        rate_map = msprime.RateMap(position=np.arange(self.gen_arch.L + 1),
+                                   rate=rates)
+        # NOTE: seeding from numpy, so that runs remain reproducible
+        ts = msprime.sim_mutations(self._tc.tree_sequence(), rate=rate_map,
+                                   model=msprime.BinaryMutationModel(),
+                                   discrete_genome=True, keep=True,
+                                   start_time=start_time,
+                                   end_time=self._neut_overlay_time,
+                                   random_seed=r.randint(1, 2**31 - 1))
+        self._tc = ts.dump_tables()
+        self._neut_overlay_time = start_time
+
+
     # method to sort and simplify the TableCollection,
     # and update Individuals' node IDs
     # NOTE: rather than deduplicate sites (and sometimes
@@ -1106,6 +1354,11 @@ class Species(OD):
                                       ' AT LEAST ONE TRAIT!)')
             print('ALL INDIVIDUAL IDS APPEAR CORRECTLY REASSIGNED\n')
 
+        # overlay any neutral mutations not yet placed, if needed
+        # (this does not change the tables' individuals or nodes)
+        if self.gen_arch.overlay_neut_muts:
+            self._overlay_neutral_mutations()
+
         # set the sorted_and_simplified flag to True
         self._tc_sorted_and_simplified = True
 
@@ -1137,6 +1390,9 @@ class Species(OD):
             if not self._tc_sorted_and_simplified:
                 self._sort_simplify_table_collection()
             nodes = self._get_nodes()
+        # recapitate the TableCollection, if needed
+        if self.gen_arch.recapitate:
+            self._recapitate_table_collection()
         lin_dicts = _get_lineage_dicts(self, nodes, loci, t_curr=self.t,
                                        drop_before_sim=drop_before_sim,
                                        time_before_present=time_before_present,
@@ -1295,7 +1551,11 @@ class Species(OD):
         #haps = [np.int8([*hap]) for n, hap in zip(
         #                                    np.where(self._tc.nodes.flags)[0],
         #                                    ts.haplotypes()) if n in samples]
-        haps_dict = {s:h for s, h in zip(ts.samples(), ts.haplotypes())}
+        # NOTE: not treating isolated samples as missing data, because if the
+        # starting population's ancestry has not been recapitated then any
+        # surviving founders' nodes will be isolated in the trees
+        haps_dict = {s:h for s, h in zip(ts.samples(), ts.haplotypes(
+                                                isolated_as_missing=False))}
         haps = [np.int8([*haps_dict[s]]) for s in samples_to_keep]
 
         # get the genotypes by combining each consecutive group
@@ -1353,7 +1613,13 @@ class Species(OD):
         return fits
 
     def _calc_fitness(self, trait_num = None, set_fit = True):
-        fit = _calc_fitness(self, trait_num = trait_num)
+        #use the fitness cache, recalculating only the individuals whose
+        #environmental values or genomes have changed, unless fitness is
+        #being calculated for a single trait
+        if trait_num is None and self._fit_cache is not None:
+            fit = self._fit_cache._update(self)
+        else:
+            fit = _calc_fitness(self, trait_num = trait_num)
         #set individuals' fitness attributes, if indicated
         if set_fit:
             self._set_fit(fit)
@@ -2115,6 +2381,9 @@ class Species(OD):
         # sort and simplify the TableCollection if needed
         if not self._tc_sorted_and_simplified:
             self._sort_simplify_table_collection()
+        # recapitate the TableCollection, if needed
+        if self.gen_arch.recapitate:
+            self._recapitate_table_collection()
         # grab the TableCollection and its TreeSequence
         tc = self._tc
         try:
@@ -2409,7 +2678,7 @@ def _make_species(land, name, idx, spp_params, burn=False, verbose=False):
 
     #set phenotypes, if the species has genomes
     if spp.gen_arch is not None and not burn:
-        [ind._set_z(spp.gen_arch) for ind in spp.values()]
+        spp._set_z()
 
     #make density_grid
     spp._set_dens_grids(land)
@@ -10,11 +10,17 @@ Defines core IO functions
 # other imports
 import os
 import csv
+import gzip
+import zlib
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import geopandas as gpd
-from shapely.geometry import Point
 import rasterio
+from rasterio.windows import from_bounds
+from rasterio.enums import Resampling
 
 
 ######################################
@@ -53,6 +59,111 @@ _DEFAULT_PROJ = '''PROJCS["WGS 84 / Pseudo-Mercator",
     EXTENSION["PROJ4","+proj=merc +a=6378137 +b=6378137 +lat_ts=0.0 +lon_0=0.0 +x_0=0.0 +y_0=0 +k=1.0 +units=m +nadgrids=@null +wktext +no_defs"],
     AUTHORITY["EPSG","3857"]]'''
 
+######################################
+# -----------------------------------#
+# CLASSES ---------------------------#
+# -----------------------------------#
+######################################
+
+# a minimal, write-only BGZF (blocked gzip) file, the compression format
+# expected by tabix and bcftools for indexed VCFs; it is a series of
+# independent gzip members, each holding <= 64 KB of uncompressed data and
+# carrying its compressed size in a 'BC' extra subfield, followed by an
+# empty end-of-file member (NOTE: because each member is a valid gzip member,
+# the files can also be read by any gzip reader)
+class _BgzfFile:
+    #maximum uncompressed bytes per block (as used by htslib)
+    _BLOCK_SIZE = 0xff00
+    #the fixed header of each block, with one slot for the block size - 1
+    _HEADER = struct.Struct('<4BI2BH2BHH')
+    #the fixed end-of-file block
+    _EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000'
+                         '000000')
+
+    def __init__(self, filepath, compresslevel=6):
+        self._f = open(filepath, 'wb')
+        self._compresslevel = compresslevel
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data):
+        self._buffer.extend(data)
+        while len(self._buffer) >= self._BLOCK_SIZE:
+            self._write_block(bytes(self._buffer[:self._BLOCK_SIZE]))
+            del self._buffer[:self._BLOCK_SIZE]
+
+    def _write_block(self, data):
+        compressor = zlib.compressobj(self._compresslevel, zlib.DEFLATED, -15)
+        cdata = compressor.compress(data) + compressor.flush()
+        #block size is the header (18 bytes), the compressed data, and the
+        #CRC and uncompressed-size footer (8 bytes)
+        bsize = 18 + len(cdata) + 8
+        self._f.write(self._HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6,
+                                        66, 67, 2, bsize - 1))
+        self._f.write(cdata)
+        self._f.write(struct.pack('<II', zlib.crc32(data), len(data)))
+
+    def close(self):
+        if len(self._buffer) > 0:
+            self._write_block(bytes(self._buffer))
+            self._buffer = bytearray()
+        self._f.write(self._EOF)
+        self._f.close()
+
+
+# a writer that runs output functions (i.e. functions that format data and
+# write it to disk) either immediately, or else in a background thread, so
+# that the model can keep running while output is written; in the latter
+# case, at most max_pending output functions are queued, and submitting
+# another blocks until the oldest one is done (to bound the memory held by
+# the queued data, i.e. to apply back-pressure when disk is slow)
+# NOTE: the data passed to an output function must not be changed by the
+# model after it is submitted, so callers must pass snapshots of any
+# data that the model could change in place
+class _OutputWriter:
+    def __init__(self, background=False, max_pending=4):
+        self.background = background
+        self.max_pending = max_pending
+        # the executor is created when first needed, and shut down when
+        # flushed, so that no threads are left running between iterations
+        self._executor = None
+        self._pending = []
+
+    # run or queue an output function
+    def _submit(self, fn, *args, **kwargs):
+        if not self.background:
+            fn(*args, **kwargs)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        # wait for the oldest pending functions, if the queue is full
+        # (NOTE: result() also re-raises any error from the background)
+        while len(self._pending) >= self.max_pending:
+            self._pending.pop(0).result()
+        self._pending.append(self._executor.submit(fn, *args, **kwargs))
+
+    # wait for all pending output functions to finish, then shut down
+    # the background thread
+    def _flush(self):
+        try:
+            while len(self._pending) > 0:
+                self._pending.pop(0).result()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    # flush before copying or pickling (since threads can't be copied)
+    def __getstate__(self):
+        self._flush()
+        return self.__dict__.copy()
+
+
 ######################################
 # -----------------------------------#
 # FUNCTIONS -------------------------#
@@ -64,8 +175,16 @@ _DEFAULT_PROJ = '''PROJCS["WGS 84 / Pseudo-Mercator",
 #    # Read #
 #    ########
 
-def _read_raster(filepath, coord_prec, dim=None):
+# NOTE: for GIS raster files, a window (i.e. a bounding box of
+# (xmin, ymin, xmax, ymax) in the file's coordinate units) and/or a target
+# resolution (x, y) can be provided, in which case only the cells within the
+# window are read, and they are resampled (by averaging, using the file's
+# overviews if it has any) to the target resolution as they are read
+def _read_raster(filepath, coord_prec, dim=None, window=None,
+                 target_res=None):
     if os.path.splitext(filepath)[1].lower() == '.txt':
+        assert window is None and target_res is None, ("Windowed and "
+            "resampled reads are not available for .txt files.")
         rast = np.fromfile(filepath, sep=' ')
         assert len(rast) == np.prod(dim), ('The raster read in from the .txt '
                                            'file provided does not have a '
@@ -78,39 +197,148 @@ def _read_raster(filepath, coord_prec, dim=None):
         res = (1, 1)
         ulc = (0, 0)
         prj = None
-    else:
+    elif window is None and target_res is None:
         rast_file = rasterio.open(filepath)
         rast = rast_file.read()[0, :, :]
-        dim = rast.shape[::-1]
-        # NOTE: rasterio has switched to using the proper affine transform
-        # matrix as the dataset.transform attribute (see, for example,
-        # https://www.perrygeo.com/python-affine-transforms.html). However, the
-        # get_transform() method still returns the affine transform's tuple
-        # in GDAL format, which is specified (according to the
-        # tutorial at https://www.gdal.org/gdal_tutorial.html) as:
-        # adfGeoTransform[0] /* top left x */
-        # adfGeoTransform[1] /* w-e pixel resolution */
-        # adfGeoTransform[2] /* 0 */
-        # adfGeoTransform[3] /* top left y */
-        # adfGeoTransform[4] /* 0 */
-        # adfGeoTransform[5] /* n-s pixel resolution (negative value) */
-        res = tuple([i for n, i in enumerate(rast_file.get_transform(
-                                                        )) if n in [1, 5]])
-        res = np.round(res, coord_prec)
-        ulc = tuple([i for n, i in enumerate(rast_file.get_transform(
-                                                        )) if n in [0, 3]])
-        ulc = np.round(ulc, coord_prec)
-        # get the projection as a CRS object
-        prj = rast_file.crs
+        dim, res, ulc, prj = _get_raster_file_metadata(rast_file, coord_prec)
+    else:
+        with rasterio.open(filepath) as rast_file:
+            read_window, transform, out_shape = _get_read_window(rast_file,
+                                                        window, target_res)
+            rast = rast_file.read(1, window=read_window, out_shape=out_shape,
+                                  resampling=Resampling.average)
+            dim, res, ulc, prj = _get_raster_file_metadata(rast_file,
+                                coord_prec, transform=transform,
+                                shape=rast.shape)
     return(rast, dim, res, ulc, prj)
 
 
+# get the window of an open rasterio dataset to be read (in rows and columns,
+# snapped to the file's cells, or else the full extent of the file), its
+# transform, and the output shape (at the target resolution, if provided,
+# in which case the transform is rescaled accordingly)
+def _get_read_window(rast_file, window=None, target_res=None):
+    if window is not None:
+        read_window = from_bounds(*window,
+            transform=rast_file.transform).round_offsets().round_lengths()
+    else:
+        read_window = rasterio.windows.Window(0, 0, rast_file.width,
+                                              rast_file.height)
+    transform = rast_file.window_transform(read_window)
+    out_shape = (int(read_window.height), int(read_window.width))
+    if target_res is not None:
+        out_shape = (max(1, int(round(read_window.height * abs(
+                            transform.e) / abs(target_res[1])))),
+                     max(1, int(round(read_window.width * abs(
+                            transform.a) / abs(target_res[0])))))
+        transform = transform * transform.scale(
+                                read_window.width / out_shape[1],
+                                read_window.height / out_shape[0])
+    return(read_window, transform, out_shape)
+
+
+# read only the metadata (dim, res, ulc, and prj) of a raster file
+# (or of the window and/or target resolution that would be read from it),
+# without reading its values (for a .txt file, the dimensions provided
+# are assumed, and will be checked when the file is read)
+def _read_raster_metadata(filepath, coord_prec, dim=None, window=None,
+                          target_res=None):
+    if os.path.splitext(filepath)[1].lower() == '.txt':
+        assert window is None and target_res is None, ("Windowed and "
+            "resampled reads are not available for .txt files.")
+        dim = tuple(dim)[::-1]
+        res = (1, 1)
+        ulc = (0, 0)
+        prj = None
+    elif window is None and target_res is None:
+        with rasterio.open(filepath) as rast_file:
+            dim, res, ulc, prj = _get_raster_file_metadata(rast_file,
+                                                           coord_prec)
+    else:
+        with rasterio.open(filepath) as rast_file:
+            _, transform, out_shape = _get_read_window(rast_file, window,
+                                                       target_res)
+            dim, res, ulc, prj = _get_raster_file_metadata(rast_file,
+                                coord_prec, transform=transform,
+                                shape=out_shape)
+    return(dim, res, ulc, prj)
+
+
+# get the dim, res, ulc, and prj values of an open rasterio dataset
+# (or of a window of it, if the window's transform and shape are provided)
+def _get_raster_file_metadata(rast_file, coord_prec, transform=None,
+                              shape=None):
+    if shape is None:
+        shape = rast_file.shape
+    dim = shape[::-1]
+    # NOTE: rasterio has switched to using the proper affine transform
+    # matrix as the dataset.transform attribute (see, for example,
+    # https://www.perrygeo.com/python-affine-transforms.html). However, the
+    # get_transform() method still returns the affine transform's tuple
+    # in GDAL format, which is specified (according to the
+    # tutorial at https://www.gdal.org/gdal_tutorial.html) as:
+    # adfGeoTransform[0] /* top left x */
+    # adfGeoTransform[1] /* w-e pixel resolution */
+    # adfGeoTransform[2] /* 0 */
+    # adfGeoTransform[3] /* top left y */
+    # adfGeoTransform[4] /* 0 */
+    # adfGeoTransform[5] /* n-s pixel resolution (negative value) */
+    if transform is None:
+        gdal_transform = rast_file.get_transform()
+    else:
+        gdal_transform = transform.to_gdal()
+    res = tuple([i for n, i in enumerate(gdal_transform) if n in [1, 5]])
+    res = np.round(res, coord_prec)
+    ulc = tuple([i for n, i in enumerate(gdal_transform) if n in [0, 3]])
+    ulc = np.round(ulc, coord_prec)
+    # get the projection as a CRS object
+    prj = rast_file.crs
+    return(dim, res, ulc, prj)
+
+
 # read a txt file containing a stack of 2d arrays (such as is created to save 
 # LD data)
 def _read_array_stack(filepath):
     array = np.loadtxt(filepath)
     return(array)
 
+# read a snapshot file (i.e. an uncompressed NPZ file, as written by
+# _append_arrays_to_npz), returning a dict of arrays for each of its
+# timesteps; if mmap_mode is not None then each array is memory-mapped,
+# rather than read, from its location within the file
+# NOTE: works because NPZ members are stored uncompressed, such that each
+# member's array data is contiguous within the file, at an offset given by
+# the member's local ZIP header and its NPY header
+def _read_snapshots(filepath, mmap_mode='r'):
+    snapshots = {}
+    with zipfile.ZipFile(filepath, 'r') as zf, open(filepath, 'rb') as f:
+        for info in zf.infolist():
+            group, name = os.path.splitext(info.filename)[0].split('/')
+            t = int(group.split('-')[1])
+            if t not in snapshots:
+                snapshots[t] = {}
+            # skip the member's local header (30 fixed bytes, plus
+            # variable-length filename and extra fields) and NPY header
+            f.seek(info.header_offset)
+            local_header = struct.unpack('<4s5H3I2H', f.read(30))
+            f.seek(info.header_offset + 30 + sum(local_header[-2:]))
+            version = np.lib.format.read_magic(f)
+            read_header = {(1, 0): np.lib.format.read_array_header_1_0,
+                           (2, 0): np.lib.format.read_array_header_2_0}[
+                                                                    version]
+            shape, fortran_order, dtype = read_header(f)
+            if mmap_mode is None or np.prod(shape) == 0:
+                array = np.frombuffer(f.read(int(np.prod(
+                    shape)) * dtype.itemsize), dtype=dtype).reshape(shape,
+                                        order='F' if fortran_order else 'C')
+            else:
+                array = np.memmap(filepath, dtype=dtype, mode=mmap_mode,
+                                  offset=f.tell(), shape=shape,
+                                  order='F' if fortran_order else 'C')
+            snapshots[t][name] = array
+    return snapshots
+
+
     #########
     # Write #
     #########
@@ -122,6 +350,33 @@ def _write_file(filepath, data):
         f.write(data)
 
 
+# open a file for streaming binary writes, optionally compressed
+# (compression can be None, 'gzip', or 'bgzf')
+def _open_write_file(filepath, compression=None):
+    assert compression in [None, 'gzip', 'bgzf'], ("The compression "
+        "must be one of None, 'gzip', or 'bgzf'.")
+    if compression is None:
+        f = open(filepath, 'wb')
+    elif compression == 'gzip':
+        f = gzip.open(filepath, 'wb', compresslevel=6)
+    elif compression == 'bgzf':
+        f = _BgzfFile(filepath)
+    return f
+
+
+# append a timestep's dict of arrays to a snapshot file (an uncompressed
+# NPZ file, which will be created if it doesn't exist), storing each array
+# as the member '<group>/<name>.npy'
+def _append_arrays_to_npz(filepath, group, arrays):
+    with zipfile.ZipFile(filepath, mode='a', compression=zipfile.ZIP_STORED,
+                         allowZip64=True) as zf:
+        for name, array in arrays.items():
+            with zf.open('%s/%s.npy' % (group, name), 'w',
+                         force_zip64=True) as f:
+                np.lib.format.write_array(f, np.asanyarray(array),
+                                          allow_pickle=False)
+
+
 # write a CSV of data from a dictionary of columns
 def _write_dict_to_csv(filepath, array_1d_dict):
     # make a pandas DataFrame from the species' stats
@@ -160,46 +415,82 @@ def _append_row_to_csv(filepath, locuswise_array1d, t):
         dict_writer.writerow({'t': t, **data_dict})
 
 
-# write a data file from a geopandas object created from an index-keyed dict
-# of individual.Individual objects
-def _write_geopandas(filepath, individuals, driver):
-    # get full path and filename
-    attributes = ['idx', 'z', 'e', 'age', 'sex']
-    # TODO: FIXME: replace the call to str() below with something more
-    # sophisticated that will actually separate distinct phenotype
-    # and environment values into separate, labeled columns
-    # TODO: also round numbers to 5 decimals or so?
-    df_dict = {att: [str(getattr(
-            ind, att)) for ind in individuals.values()] for att in attributes}
-    pts = [Point(ind.x, ind.y) for ind in individuals.values()]
-    df_dict['pt'] = pts
-    df = pd.DataFrame.from_dict(df_dict)
-    gdf = gpd.GeoDataFrame(df, geometry='pt')
-    if driver == 'CSV':
-        gdf['x'] = gdf.pt.x
-        gdf['y'] = gdf.pt.y
-        gdf = gdf.drop(labels=('pt'), axis=1)
-        gdf.to_csv(filepath, index=False)
-    else:
-        gdf.to_file(filepath, driver=driver)
+# get an ordered dict of typed 1d column arrays from an index-keyed dict of
+# individual.Individual objects, with each individual's phenotypes and
+# environmental values split into separate, numbered columns ('z_0', 'z_1',
+# ..., 'e_0', 'e_1', ...), plus the separate arrays of x and y coordinates
+def _get_geodata_columns(individuals):
+    inds = [*individuals.values()]
+    n = len(inds)
+    n_z = len(inds[0].z) if n > 0 else 0
+    n_e = len(inds[0].e) if n > 0 else 0
+    cols = {'idx': np.fromiter((ind.idx for ind in inds), dtype=np.int64,
+                               count=n)}
+    z = np.array([ind.z for ind in inds], dtype=np.float64).reshape((n, n_z))
+    e = np.array([ind.e for ind in inds], dtype=np.float64).reshape((n, n_e))
+    cols.update({'z_%i' % i: z[:, i] for i in range(n_z)})
+    cols.update({'e_%i' % i: e[:, i] for i in range(n_e)})
+    cols['age'] = np.fromiter((ind.age for ind in inds), dtype=np.int64,
+                              count=n)
+    cols['sex'] = np.fromiter((ind.sex for ind in inds), dtype=np.int64,
+                              count=n)
+    x = np.fromiter((ind.x for ind in inds), dtype=np.float64, count=n)
+    y = np.fromiter((ind.y for ind in inds), dtype=np.float64, count=n)
+    return cols, x, y
+
+
+# get a column's values as a list of strings (using repr for floats, so that
+# values are written at full precision but without trailing noise, and
+# optionally writing non-finite floats (i.e. NaN or inf, which would be
+# written as 'nan' or 'inf') as the given string instead)
+def _format_geodata_column(col, nonfinite=None):
+    if np.issubdtype(col.dtype, np.floating):
+        vals = [*map(repr, col.tolist())]
+        if nonfinite is not None:
+            for i in np.flatnonzero(~np.isfinite(col)):
+                vals[i] = nonfinite
+        return vals
+    return [*map(str, col.tolist())]
 
 
 # write a shapefile from an index-keyed dict of individual.Individual objects
 def _write_shapefile(filepath, individuals):
     filepath = _set_extension(filepath, 'shp')
-    _write_geopandas(filepath, individuals, driver='ESRI Shapefile')
+    cols, x, y = _get_geodata_columns(individuals)
+    gdf = gpd.GeoDataFrame(cols, geometry=gpd.points_from_xy(x, y))
+    gdf.to_file(filepath, driver='ESRI Shapefile')
 
 
 # write a geojson from an index-keyed dict of individual.Individual objects
+# (writing the FeatureCollection's text directly, rather than by way of a
+# GeoDataFrame, and writing any non-finite values (e.g. environmental values
+# from NaN raster cells) as null, because NaN and inf are not valid JSON)
 def _write_geojson(filepath, individuals):
     filepath = _set_extension(filepath, ['json', 'geojson'])
-    _write_geopandas(filepath, individuals, driver='GeoJSON')
+    cols, x, y = _get_geodata_columns(individuals)
+    # make a template for a single feature
+    props = ', '.join('"%s": %%s' % name for name in cols.keys())
+    template = ('{"type": "Feature", "properties": {%s}, "geometry": '
+                '{"type": "Point", "coordinates": [%%s, %%s]}}') % props
+    vals = [_format_geodata_column(col, nonfinite='null') for col in [
+                                                    *cols.values(), x, y]]
+    with open(filepath, 'w') as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        f.write(',\n'.join(template % row for row in zip(*vals)))
+        f.write('\n]}\n')
 
 
 # write a csv from an index-keyed dict of individual.Individual objects
+# (writing the columns' text directly, so that geopandas is not needed)
 def _write_csv(filepath, individuals):
     filepath = _set_extension(filepath, 'csv')
-    _write_geopandas(filepath, individuals, driver='CSV')
+    cols, x, y = _get_geodata_columns(individuals)
+    cols['x'] = x
+    cols['y'] = y
+    vals = [_format_geodata_column(col) for col in cols.values()]
+    with open(filepath, 'w') as f:
+        f.write(','.join(cols.keys()) + '\n')
+        f.writelines(','.join(row) + '\n' for row in zip(*vals))
 
 
 # write a txt array from a landscape.Layer object's numpy-array raster
@@ -17,7 +17,8 @@ from collections import Counter as C
 from copy import deepcopy
 from operator import itemgetter as ig
 from scipy import interpolate
-from scipy.spatial import cKDTree
+from scipy import signal
+from scipy.spatial import cKDTree, Delaunay
 from shapely import geometry as g
 
 try:
@@ -107,7 +108,8 @@ class _DensityGrid:
 
 
 class _DensityGridStack:
-    def __init__(self, land, window_width=None):
+    def __init__(self, land, window_width=None, coarsening_factor=1,
+                 estimator='grid'):
 
         # dimensions
         self.dim = land.dim
@@ -134,24 +136,101 @@ class _DensityGridStack:
                                                            self.dim[0])+0.5,
                                                  np.arange(0, self.dim[1])+0.5)
 
-        # create inner and outer density grids from the land and window-width
-        self.grids = dict([(n, g) for n, g in enumerate(
-            _make_density_grids(land, self.window_width))])
+        # get meshgrids of the j and i cell-center coordinates of the
+        # coarsened raster's cells (to be interpolated to for density
+        # calculation when demography is run on a coarsened raster)
+        self.coarsening_factor = coarsening_factor
+        if coarsening_factor > 1:
+            self.coarse_gj, self.coarse_gi = np.meshgrid(
+                _get_coarse_cell_centers(self.dim[0], coarsening_factor),
+                _get_coarse_cell_centers(self.dim[1], coarsening_factor))
+        else:
+            self.coarse_gj, self.coarse_gi = self.land_gj, self.land_gi
+
+        # set the density estimator ('grid', to interpolate the densities
+        # counted within the density grids' windows, or 'gaussian' or 'box',
+        # to use a kernel-density estimator with that smoothing kernel)
+        assert estimator in ['grid', 'gaussian', 'box'], ("The density "
+            "estimator must be one of 'grid', 'gaussian', or 'box'.")
+        self.estimator = estimator
+
+        if self.estimator == 'grid':
+            # create inner and outer density grids from the land and
+            # window-width
+            self.grids = dict([(n, g) for n, g in enumerate(
+                _make_density_grids(land, self.window_width))])
+
+            # get a concatenated list of the grid-cell center coordinates
+            # from all density grids, and their Delaunay triangulation
+            # (both of which are fixed, so are only calculated once, here)
+            self.pts = np.vstack([self.grids[n].grid_coords for n in range(
+                len(self.grids))])
+            self._tri = Delaunay(self.pts)
 
-    def _calc_density(self, x, y):
-        # get a concatenated list of the grid-cell center coordinates
-        # from all density grids
-        pts = np.vstack([self.grids[n].grid_coords for n in range(len(
-            self.grids))])
-        # and a concatenated list of the densities calculated for
+        else:
+            # get the smoothing kernels and the edge-correction rasters
+            # (i.e. the kernel-smoothed area of landscape around each cell)
+            # for the kernel-density estimator, for both the landscape's
+            # raster and the coarsened raster (both of which are fixed,
+            # so are only calculated once, here)
+            self._kde_kernels = {}
+            self._kde_norms = {}
+            for coarse in [False, True]:
+                factor = coarsening_factor if coarse else 1
+                kernel = _make_smoothing_kernel(self.estimator,
+                                                self.window_width / factor)
+                areas = np.outer(
+                    _get_coarse_cell_sizes(self.land_gi.shape[0], factor),
+                    _get_coarse_cell_sizes(self.land_gi.shape[1], factor))
+                self._kde_kernels[coarse] = kernel
+                self._kde_norms[coarse] = signal.fftconvolve(areas, kernel,
+                                                             mode='same')
+
+    # NOTE: if a boolean mask of landscape cells is provided then the density
+    # is only interpolated to those cells' centerpoints, and a 1d array
+    # of their values is returned; if coarse is True then the density is
+    # interpolated to the coarsened raster's cells instead
+    def _calc_density(self, x, y, mask=None, coarse=False):
+        # use the kernel-density estimator instead, if requested
+        if self.estimator != 'grid':
+            return self._calc_kde_density(x, y, mask=mask, coarse=coarse)
+
+        # get a concatenated list of the densities calculated for
         # all density grids
         vals = np.hstack([self.grids[n]._calc_density(
             x, y).flatten() for n in range(len(self.grids))])
 
         # then interpolate from those points and values to the centerpoints
-        # of all of the land centerpoints
-        dens = interpolate.griddata(pts, vals, (self.land_gi, self.land_gj),
-                                    method='cubic')
+        # of all of the land centerpoints (using the same piecewise cubic
+        # interpolator as interpolate.griddata(method='cubic'), but on the
+        # precalculated triangulation)
+        interp = interpolate.CloughTocher2DInterpolator(self._tri, vals)
+        if coarse:
+            gi, gj = self.coarse_gi, self.coarse_gj
+        else:
+            gi, gj = self.land_gi, self.land_gj
+        if mask is None:
+            dens = interp((gi, gj))
+        else:
+            dens = interp((gi[mask], gj[mask]))
+        return dens
+
+    # kernel-density estimator: count the individuals in each cell, then
+    # smooth the counts with the (separable) kernel by FFT convolution, and
+    # divide by the equally smoothed cell areas (which corrects for the
+    # landscape edges, and yields densities per landscape cell);
+    # its cost is O(cells log cells), independent of the number of individuals
+    def _calc_kde_density(self, x, y, mask=None, coarse=False):
+        factor = self.coarsening_factor if coarse else 1
+        norm = self._kde_norms[coarse]
+        i = np.clip(np.int64(y // factor), 0, norm.shape[0] - 1)
+        j = np.clip(np.int64(x // factor), 0, norm.shape[1] - 1)
+        counts = np.bincount(i * norm.shape[1] + j,
+                             minlength=norm.size).reshape(norm.shape)
+        dens = signal.fftconvolve(counts, self._kde_kernels[coarse],
+                                  mode='same') / norm
+        if mask is not None:
+            dens = dens[mask]
         return dens
 
 
@@ -369,6 +448,58 @@ def _make_density_grids(land, ww):
     return(g1, g2, g3, g4)
 
 
+# get the cell-center coordinates, along a landscape dimension of length dim,
+# of the cells of a raster coarsened by the given factor
+# (the last coarse cell being truncated, if factor does not divide dim)
+def _get_coarse_cell_centers(dim, factor):
+    starts = np.arange(0, dim, factor)
+    return starts + _get_coarse_cell_sizes(dim, factor) / 2
+
+
+# get the sizes, along a landscape dimension of length dim, of the cells of
+# a raster coarsened by the given factor
+def _get_coarse_cell_sizes(dim, factor):
+    starts = np.arange(0, dim, factor)
+    stops = np.clip(starts + factor, a_min=None, a_max=dim)
+    return stops - starts
+
+
+# make the 2d smoothing kernel for the kernel-density estimator, as the outer
+# product of a 1d box kernel of the given width (in cells), or of a 1d
+# Gaussian kernel with the same variance as that box kernel
+def _make_smoothing_kernel(estimator, width):
+    if estimator == 'box':
+        half = max(1, int(width // 2))
+        kernel_1d = np.ones(2 * half + 1)
+    elif estimator == 'gaussian':
+        sigma = max(width, 1) / np.sqrt(12)
+        half = int(np.ceil(4 * sigma))
+        kernel_1d = np.exp(-0.5 * (np.arange(-half, half + 1) / sigma) ** 2)
+    kernel_1d = kernel_1d / kernel_1d.sum()
+    kernel = np.outer(kernel_1d, kernel_1d)
+    return kernel
+
+
+# coarsen a raster by the given integer factor, taking the mean of the
+# cells within each coarse cell (ignoring the padding of truncated
+# coarse cells at the raster's edges)
+def _coarsen_raster(rast, factor):
+    nrow = int(np.ceil(rast.shape[0] / factor))
+    ncol = int(np.ceil(rast.shape[1] / factor))
+    padded = np.full((nrow * factor, ncol * factor), np.nan)
+    padded[:rast.shape[0], :rast.shape[1]] = rast
+    coarse = np.nanmean(padded.reshape(nrow, factor, ncol, factor),
+                        axis=(1, 3))
+    return coarse
+
+
+# refine a coarsened raster back to the given (i.e. the original) shape,
+# by repeating each coarse cell's value across the cells it covers
+def _refine_raster(rast, factor, shape):
+    fine = np.repeat(np.repeat(rast, factor, axis=0), factor, axis=1)
+    return fine[:shape[0], :shape[1]]
+
+
 # Function to generate an approximated Von Mises unimodal distribution
 # sampler function
 def _make_von_mises_unimodal_sampler(neigh, dirs, vm_distr_kappa=12,
@@ -0,0 +1,55 @@
+#!usr/bin/python
+
+# density_runtime_test.py
+
+# Benchmarks the density estimators (the 'density_estimator' species
+# parameter: 'grid', 'gaussian', and 'box') across landscape sizes and
+# numbers of individuals, reporting the mean runtime of a single
+# density-raster calculation
+
+import geonomics as gnx
+from geonomics.structs.landscape import _make_landscape
+from geonomics.utils.spatial import _DensityGridStack
+import numpy as np
+import time
+
+# read in the parameters file
+params = gnx.read_parameters_file(('./tests/runtime/'
+                                   'runtime_params.py'))
+
+# define the landscape sizes and numbers of individuals to test
+dims = [(50, 50), (100, 100), (200, 200), (400, 400)]
+Ns = [1000, 10000, 100000]
+
+# define the number of repeated calculations to time for each combination
+n_reps = 5
+
+# define the seed for the individuals' coordinates
+rng = np.random.RandomState(1)
+
+# time each estimator on each landscape size and number of individuals
+runtimes = {}
+for dim in dims:
+    params['landscape']['main']['dim'] = dim
+    land = _make_landscape(None, params)
+    for estimator in ['grid', 'gaussian', 'box']:
+        print('Now timing estimator %s on a %ix%i landscape...' % (estimator,
+                                                                   *dim))
+        dens_grids = _DensityGridStack(land, estimator=estimator)
+        for N in Ns:
+            x = rng.uniform(0, dim[0] - 0.001, N)
+            y = rng.uniform(0, dim[1] - 0.001, N)
+            start = time.time()
+            for rep in range(n_reps):
+                dens_grids._calc_density(x, y)
+            stop = time.time()
+            runtimes[(dim, estimator, N)] = (stop - start) / n_reps
+
+# print the report
+print('\n' + '-'*70)
+print('dim\t\tN\tgrid (sec)\tgaussian (sec)\tbox (sec)')
+for dim in dims:
+    for N in Ns:
+        print('%ix%i\t\t%i\t%0.5f\t\t%0.5f\t\t%0.5f' % (*dim, N, *[runtimes[(
+            dim, estimator, N)] for estimator in ['grid', 'gaussian', 'box']]))
+print('-'*70)
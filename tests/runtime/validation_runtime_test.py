@@ -0,0 +1,63 @@
+#!usr/bin/python
+
+# validation_runtime_test.py
+
+# Reports how much runtime each level of the 'validation' model parameter
+# ('off', 'cheap', 'full') costs, by running the same burned-in model
+# (from the same seed) at each level
+
+import geonomics as gnx
+import numpy as np
+from copy import deepcopy
+import random
+import time
+
+# read in the parameters file
+params = gnx.read_parameters_file(('./tests/runtime/'
+                                   'runtime_params_selection.py'))
+
+# define number of timesteps to run for each validation level
+T = 50
+
+# define the number of repeated runs at each level (taking the fastest,
+# to minimize the influence of background noise on the timings)
+n_reps = 3
+
+# define the seed to use for each level's run
+seed = 1
+
+# make and burn in a single model, so that each level is run on the
+# same starting community, then walk a few main timesteps, so that the
+# one-time genome assignment is not included in the timings
+mod = gnx.make_model(params)
+mod.walk(1000000, 'burn', verbose=False)
+mod.walk(5, 'main', verbose=False)
+
+# run copies of the model at each level (alternating between the levels,
+# for each repetition), and save the runtimes
+runtimes = {level: [] for level in ['off', 'cheap', 'full']}
+for rep in range(n_reps):
+    for level in runtimes.keys():
+        print('Now timing validation level %s (rep %i)...' % (level, rep))
+        level_mod = deepcopy(mod)
+        # remake the copy's function queue (the original queue's functions
+        # would otherwise still run the original model)
+        level_mod.main_fn_queue = level_mod._make_fn_queue(burn=False)
+        level_mod._validation = level
+        for spp in level_mod.comm.values():
+            spp._validation = level
+        random.seed(seed)
+        np.random.seed(seed)
+        start = time.time()
+        level_mod.walk(T, 'main', verbose=False)
+        stop = time.time()
+        runtimes[level].append((stop - start)/T)
+runtimes = {level: min(rts) for level, rts in runtimes.items()}
+
+# print the report
+print('\n' + '-'*70)
+print('validation level\tmean runtime (sec/timestep)\toverhead vs. off')
+for level, runtime in runtimes.items():
+    overhead = 100 * (runtime - runtimes['off']) / runtimes['off']
+    print('%s\t\t\t%0.6f\t\t\t%0.2f%%' % (level, runtime, overhead))
+print('-'*70)
@@ -1,10 +1,28 @@
 import unittest
-from structs import community
-from structs import landscape
+from geonomics.structs import community
+from geonomics.structs import landscape
+from geonomics.sim import data
+from geonomics.utils import io
 import os
+import gzip
+import json
+import types
+import tempfile
+import numpy as np
+import tskit
+from copy import copy
+from collections import OrderedDict
+from scipy.spatial import cKDTree
+from shapely.geometry import Point
 import geonomics as gnx
 
 
+class _MockSpecies(OrderedDict):
+    def _get_coords(self):
+        return np.float64([[ind.x, ind.y] for ind in self.values()]).reshape(
+                                                                    (-1, 2))
+
+
 class DataTestCases(unittest.TestCase):
     """
     Unit tests for Data.py.
@@ -19,6 +37,210 @@ class DataTestCases(unittest.TestCase):
         self.assertEqual(com.n_pops, len(params.comm.pops))
         self.assertEqual(com.t, -1)
 
+    def testPointSampleMatchesBuffers(self):
+        pts = [(10, 10), (13, 10), (30, 25)]
+        radius = 2
+        collector = data._DataCollector.__new__(data._DataCollector)
+        collector.n = 10000
+        collector.radius = radius
+        collector.pts_area = data._make_point_buffers(pts, radius)
+        collector._pts_tree = cKDTree(np.float64(pts))
+        # place individuals inside the buffers' inscribed radius, outside
+        # their radius, and in the band between the two (at random angles,
+        # and at the angles of the buffers' polygons' vertices)
+        rng = np.random.RandomState(1)
+        n = 3000
+        inner = radius * np.cos(np.pi / 64)
+        dists = np.concatenate([rng.uniform(0, inner, n // 3),
+                                rng.uniform(inner, radius, n // 3),
+                                rng.uniform(radius, 2 * radius, n // 3)])
+        angles = rng.uniform(0, 2 * np.pi, n)
+        angles[::2] = np.floor(angles[::2] / (np.pi / 32)) * (np.pi / 32)
+        centers = np.float64(pts)[rng.randint(len(pts), size = n)]
+        coords = centers + dists[:, None] * np.stack((np.cos(angles),
+                                                      np.sin(angles)), axis=1)
+        spp = _MockSpecies({i: types.SimpleNamespace(x=x, y=y)
+                            for i, (x, y) in enumerate(coords)})
+        expected = [i for i, v in spp.items() if collector.pts_area.contains(
+                                                            Point(v.x, v.y))]
+        sample = collector._get_point_sample(spp)
+        self.assertEqual(sample, expected)
+        # (checking that individuals in the band fell on both sides of
+        # the buffers' polygons)
+        band = set(range(n // 3, 2 * (n // 3)))
+        self.assertTrue(0 < len(band.intersection(sample)) < len(band))
+        self.assertEqual(collector._get_point_sample(_MockSpecies()), [])
+
+    def testDumpSampleTrees(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'params.py')
+            gnx.make_parameters_file(filepath, species=[{'genomes': True,
+                                                         'n_traits': 1}])
+            mod = gnx.make_model(gnx.read_parameters_file(filepath))
+            mod.walk(10000, mode='burn', verbose=False)
+            mod.walk(2, mode='main', verbose=False)
+            spp = mod.comm[0]
+            # sample snapshots of some of the individuals, with x values
+            # that differ from those recorded in the tables at their births
+            sample = {}
+            for idx in [*spp][::5]:
+                sample[idx] = copy(spp[idx])
+                sample[idx].x = spp[idx].x / 2
+            tc, nodes = data._get_sample_tables(sample, spp)
+            filepath = os.path.join(tmpdir, 'test.trees')
+            data._dump_trees(filepath, tc, nodes)
+            ts = tskit.load(filepath)
+        self.assertEqual(ts.num_sites, spp.gen_arch.L)
+        self.assertEqual(ts.num_samples, 2 * len(sample))
+        # the sample nodes map, in order, to the sampled individuals
+        # (identified by the gnx idxs stored in the individuals' metadata),
+        # whose locations hold their current x, y, z, and fit values
+        for node in ts.samples():
+            ind = ts.individual(ts.node(node).individual)
+            idx = int.from_bytes(ind.metadata, byteorder='little')
+            self.assertEqual(idx, [*sample][node // 2])
+            self.assertTrue(np.allclose(ind.location,
+                                        [sample[idx].x, sample[idx].y,
+                                         *sample[idx].z, sample[idx].fit]))
+
+    def testWriteVCF(self):
+        sample = {i: None for i in range(5)}
+        genotypes = {i: np.int8(np.random.binomial(1, 0.5,
+                                                   (100, 2))) for i in sample}
+        gen_arch = types.SimpleNamespace(L=100)
+        vcfs = {}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for compression in [None, 'gzip', 'bgzf']:
+                filepath = os.path.join(tmpdir, 'test_%s.vcf' % compression)
+                with io._open_write_file(filepath, compression) as f:
+                    data._write_vcf(f, sample, genotypes, gen_arch,
+                                    include_fixed_sites=True)
+                if compression is None:
+                    vcfs[compression] = open(filepath, 'rb').read()
+                else:
+                    vcfs[compression] = gzip.open(filepath, 'rb').read()
+        self.assertEqual(vcfs[None], vcfs['gzip'])
+        self.assertEqual(vcfs[None], vcfs['bgzf'])
+        rows = vcfs[None].decode().splitlines()[4:]
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(rows[0].split('\t')[9:], ['%i|%i' % tuple(
+                                genotypes[i][0]) for i in sample])
+
+    def testWriteFASTA(self):
+        sample = {i: types.SimpleNamespace(idx=i, x=1.5, y=2.5, age=3, sex=0,
+                                           z=[0.5, 0.25], e=[0.75])
+                  for i in range(3)}
+        genotypes = {i: np.int8(np.random.binomial(1, 0.5,
+                                                   (50, 2))) for i in sample}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'test.fasta')
+            with io._open_write_file(filepath) as f:
+                data._write_fasta(f, sample, genotypes)
+            rows = open(filepath, 'r').read().splitlines()
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[2], '>0:1;1.5;2.5;3;0;0.5|0.25;0.75')
+        self.assertEqual(rows[3], ''.join([str(base) for base in (
+                                                    genotypes[0][:, 1])]))
+
+    def testSnapshotRoundTrip(self):
+        arrays = {t: {'x': np.random.uniform(size=10),
+                      'genotypes': np.int8(np.random.binomial(1, 0.5,
+                                                              (10, 20, 2)))}
+                  for t in [0, 5]}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'test.npz')
+            for t in arrays:
+                io._append_arrays_to_npz(filepath, 't-%i' % t, arrays[t])
+            snapshots = io._read_snapshots(filepath)
+            npz = np.load(filepath)
+            for t in arrays:
+                for name, array in arrays[t].items():
+                    self.assertIsInstance(snapshots[t][name], np.memmap)
+                    self.assertTrue(np.all(snapshots[t][name] == array))
+                    self.assertTrue(np.all(npz['t-%i/%s' % (t,
+                                                        name)] == array))
+            npz.close()
+            del snapshots
+
+    def testSnapshotArraysWithSingleLoci(self):
+        sample = {i: types.SimpleNamespace(idx=i, x=1.5, y=2.5, age=3, sex=0,
+                                           fit=None, e=[0.75], z=[0.5])
+                  for i in range(3)}
+        genotypes = {i: np.int8(np.random.binomial(1, 0.5,
+                                                   (10, 2))) for i in sample}
+        # one trait locus and one deleterious locus, as a species would
+        # have them (i.e. in 1-length arrays)
+        trt = types.SimpleNamespace(loci=np.int64([2]), alpha=np.array([0.5]))
+        gen_arch = types.SimpleNamespace(nonneut_loci=np.int64([2, 7]),
+                                         delet_loci=np.int64([7]),
+                                         delet_loci_s=np.array([0.1]),
+                                         traits={0: trt})
+        arrays = data._make_snapshot_arrays(sample, genotypes, gen_arch)
+        for name, dtype, vals in [('nonneut_loci', np.int64, [2, 7]),
+                                  ('delet_loci', np.int64, [7]),
+                                  ('delet_loci_s', np.float64, [0.1]),
+                                  ('trait_0_loci', np.int64, [2]),
+                                  ('trait_0_alpha', np.float64, [0.5])]:
+            self.assertEqual(arrays[name].dtype, dtype)
+            self.assertEqual(arrays[name].shape, (len(vals),))
+            self.assertTrue(np.allclose(arrays[name], vals))
+        # and they survive a round trip through a snapshot file
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'test.npz')
+            io._append_arrays_to_npz(filepath, 't-0', arrays)
+            npz = np.load(filepath)
+            self.assertEqual(npz['t-0/delet_loci_s'].shape, (1,))
+            self.assertEqual(npz['t-0/trait_0_alpha'].shape, (1,))
+            npz.close()
+
+    def testBackgroundOutputWriter(self):
+        written = []
+        writer = io._OutputWriter(background=True, max_pending=2)
+        for n in range(10):
+            writer._submit(written.append, n)
+            self.assertLessEqual(len(writer._pending), 2)
+        writer._flush()
+        self.assertEqual(written, [*range(10)])
+        self.assertIsNone(writer._executor)
+        # errors raised in the background are re-raised when flushed
+        writer._submit(io._write_file, '/NONEXISTENT/DIR/FILE.txt', '')
+        self.assertRaises(FileNotFoundError, writer._flush)
+
+    def testWriteGeodata(self):
+        individuals = {i: types.SimpleNamespace(idx=i, x=i + 0.5, y=i + 0.25,
+                                                age=i, sex=i % 2,
+                                                z=[0.5, 1.0],
+                                                e=[np.float64(0.1 * i)])
+                       for i in range(5)}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'test.csv')
+            io._write_csv(filepath, individuals)
+            with open(filepath, 'r') as f:
+                rows = f.read().splitlines()
+            filepath = os.path.join(tmpdir, 'test.geojson')
+            io._write_geojson(filepath, individuals)
+            with open(filepath, 'r') as f:
+                geojson = json.load(f)
+        self.assertEqual(rows[0], 'idx,z_0,z_1,e_0,age,sex,x,y')
+        self.assertEqual(rows[3], '2,0.5,1.0,0.2,2,0,2.5,2.25')
+        self.assertEqual(len(geojson['features']), 5)
+        feature = geojson['features'][3]
+        self.assertEqual(feature['properties'], {'idx': 3, 'z_0': 0.5,
+                                                 'z_1': 1.0,
+                                                 'e_0': 0.30000000000000004,
+                                                 'age': 3, 'sex': 1})
+        self.assertEqual(feature['geometry']['coordinates'], [3.5, 3.25])
+        # non-finite values are written as nulls, to keep the GeoJSON valid
+        individuals[0].e = [np.nan]
+        individuals[1].e = [np.inf]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'test.geojson')
+            io._write_geojson(filepath, individuals)
+            with open(filepath, 'r') as f:
+                geojson = json.loads(f.read(), parse_constant=self.fail)
+        self.assertIsNone(geojson['features'][0]['properties']['e_0'])
+        self.assertIsNone(geojson['features'][1]['properties']['e_0'])
+
 
 if __name__ == '__main__':
     unittest.main()
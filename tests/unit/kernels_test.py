@@ -0,0 +1,131 @@
+import unittest
+import numpy as np
+from geonomics.ops import kernels
+from geonomics.ops import movement
+import geonomics as gnx
+import os
+import random
+import tempfile
+
+
+@unittest.skipIf(not kernels._with_numba, "Module 'numba' not installed")
+class KernelsTestCases(unittest.TestCase):
+    """
+    Unit tests for kernels.py, checking that the NumPy and Numba backends
+    give the same results for the same (seeded) inputs.
+    """
+    def setUp(self):
+        self.np_kernels = kernels._get_kernels('numpy')
+        self.nb_kernels = kernels._get_kernels('numba')
+        self.rng = np.random.RandomState(1)
+
+    def test_displace(self):
+        n = 1000
+        x = self.rng.uniform(0, 50, n)
+        y = self.rng.uniform(0, 30, n)
+        direction = self.rng.vonmises(0, 0, n)
+        distance = self.rng.wald(2, 1, n)
+        for res_ratio in [(1, 1), (0.5, 2)]:
+            args = (x, y, direction, distance, *res_ratio, 50-0.001, 30-0.001)
+            np_x, np_y = self.np_kernels['displace'](*args)
+            nb_x, nb_y = self.nb_kernels['displace'](*args)
+            self.assertTrue(np.allclose(np_x, nb_x))
+            self.assertTrue(np.allclose(np_y, nb_y))
+            self.assertTrue(np.all((nb_x >= 0) & (nb_x < 50)))
+
+    def test_make_gamete(self):
+        L = 500
+        genome = np.int8(self.rng.binomial(1, 0.5, (L, 2)))
+        # one homologue chosen per locus, as for a recombination path
+        mask = np.zeros(2*L, dtype=np.bool_)
+        mask[np.arange(L)*2 + self.rng.binomial(1, 0.5, L)] = True
+        for start_homologue in [0, 1]:
+            np_gamete = self.np_kernels['make_gamete'](genome, mask,
+                                                       start_homologue)
+            nb_gamete = self.nb_kernels['make_gamete'](genome, mask,
+                                                       start_homologue)
+            self.assertTrue(np.array_equal(np_gamete, nb_gamete))
+            self.assertEqual(np_gamete.dtype, nb_gamete.dtype)
+
+    def test_calc_trait_fitness(self):
+        n = 1000
+        e = self.rng.uniform(0, 1, n)
+        z = self.rng.uniform(0, 1, n)
+        phi = self.rng.uniform(0, 0.1, n)
+        for gamma in [1, 2.5]:
+            for univ_adv in [False, True]:
+                args = (e, z, phi, gamma, univ_adv)
+                self.assertTrue(np.allclose(
+                    self.np_kernels['calc_trait_fitness'](*args),
+                    self.nb_kernels['calc_trait_fitness'](*args)))
+
+    def test_calc_deleterious_fitness(self):
+        deletome = np.float64(self.rng.binomial(2, 0.1, (1000, 50)))
+        s = self.rng.uniform(0, 0.1, 50)
+        carriers, loci = np.nonzero(deletome)
+        args = (carriers, deletome[carriers, loci], s[loci], len(deletome))
+        np_fit = self.np_kernels['calc_deleterious_fitness'](*args)
+        nb_fit = self.nb_kernels['calc_deleterious_fitness'](*args)
+        self.assertTrue(np.allclose(np_fit, nb_fit))
+        # and check against the dense calculation
+        self.assertTrue(np.allclose(np_fit, (1 - deletome * s).prod(axis=1)))
+
+    def test_calc_deleterious_fitness_one_carrier(self):
+        args = (np.int64([1]), np.float64([1]), np.float64([0.1]), 3)
+        for backend in [self.np_kernels, self.nb_kernels]:
+            fit = backend['calc_deleterious_fitness'](*args)
+            self.assertTrue(np.allclose(fit, [1, 0.9, 1]))
+
+    def test_calc_deleterious_fitness_large_s(self):
+        # homozygotes at loci with s > 0.5 get the minimum fitness factor,
+        # rather than negative (or NaN) fitnesses
+        args = (np.int64([0, 1]), np.float64([2, 1]), np.float64([.7, .7]), 2)
+        for backend in [self.np_kernels, self.nb_kernels]:
+            fit = backend['calc_deleterious_fitness'](*args)
+            self.assertTrue(np.allclose(fit, [kernels._MIN_DELETERIOUS_FACTOR,
+                                              0.3]))
+
+    def test_calc_death_probs(self):
+        d = self.rng.uniform(0, 1, 1000)
+        w = self.rng.uniform(0, 1, 1000)
+        self.assertTrue(np.allclose(
+            self.np_kernels['calc_death_probs'](d, w),
+            self.nb_kernels['calc_death_probs'](d, w)))
+
+    def _run_model(self, backend, seed=1):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'params.py')
+            gnx.make_parameters_file(filepath, species=[{'genomes': True,
+                                                         'n_traits': 1}])
+            params = gnx.read_parameters_file(filepath)
+        params.model['kernel_backend'] = backend
+        np.random.seed(seed)
+        random.seed(seed)
+        mod = gnx.make_model(params)
+        mod.walk(10000, mode='burn', verbose=False)
+        mod.walk(5, mode='main', verbose=False)
+        return mod.comm[0]
+
+    def test_model_backends_match(self):
+        np_spp = self._run_model('numpy')
+        nb_spp = self._run_model('numba')
+        self.assertEqual(np_spp.Nt, nb_spp.Nt)
+        self.assertEqual([*np_spp], [*nb_spp])
+        self.assertTrue(np.allclose(np_spp._get_coords(),
+                                    nb_spp._get_coords()))
+        self.assertTrue(np.allclose([ind.fit for ind in np_spp.values()],
+                                    [ind.fit for ind in nb_spp.values()]))
+        self.assertTrue(np.array_equal(
+                            np.stack([ind.g for ind in np_spp.values()]),
+                            np.stack([ind.g for ind in nb_spp.values()])))
+        # a lone individual can also be moved
+        for idx in [*nb_spp][1:]:
+            del nb_spp[idx]
+        old_coords = nb_spp._get_coords()
+        movement._do_movement(nb_spp)
+        self.assertEqual(nb_spp._get_coords().shape, (1, 2))
+        self.assertFalse(np.array_equal(nb_spp._get_coords(), old_coords))
+
+
+if __name__ == '__main__':
+    unittest.main()
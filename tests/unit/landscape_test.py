@@ -1,10 +1,12 @@
 import unittest
-from sim import burnin
-from sim import model
+from geonomics.sim import burnin
+from geonomics.sim import model
 import os
 import geonomics as gnx
-from structs import landscape
+from geonomics.structs import landscape
 import copy
+import tempfile
+import numpy as np
 
 
 
@@ -23,6 +25,41 @@ class LandscapeTestCases(unittest.TestCase):
         except:
             print("Can not make the random scape")
 
+    def test_make_spectral_scape(self):
+        dim = (30, 30)
+        spectral_scape = landscape._make_spectral_lyr(dim, 5)
+        self.assertEqual(spectral_scape.shape, dim)
+        self.assertTrue(0 < spectral_scape.min() < spectral_scape.max() < 1)
+        spectral_scape = landscape._make_spectral_lyr(dim, 5, num_hab_types=3)
+        self.assertEqual(sorted(set(spectral_scape.ravel())), [0, 0.5, 1])
+
+    def test_memmapped_cube_is_copy_on_write(self):
+        dim = (10, 10)
+        lyrs = {i: landscape.Layer(np.random.uniform(size=dim), 'random',
+                                   'lyr_%i' % i, dim) for i in range(2)}
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'cube.dat')
+            land = landscape.Landscape(lyrs, memmap_filepath=filepath)
+            shape = land._cube.shape
+            orig = np.array(np.memmap(filepath, dtype=land._cube.dtype,
+                                      mode='r', shape=shape))
+            # changing a Layer changes the Landscape, but not the file
+            land[0].rast = np.zeros(dim)
+            self.assertEqual(land[0].rast.sum(), 0)
+            self.assertTrue(np.all(land._get_values(np.int64([1]),
+                                                    np.int64([1]))[0,
+                                                                   0] == 0))
+            on_disk = np.memmap(filepath, dtype=land._cube.dtype, mode='r',
+                                shape=shape)
+            self.assertTrue(np.array_equal(on_disk, orig))
+            del on_disk, land
+        # and float rasters cannot be silently truncated into an int cube
+        lyrs = {0: landscape.Layer(np.ones(dim, dtype=np.int64), 'defined',
+                                   'lyr_0', dim)}
+        land = landscape.Landscape(lyrs)
+        with self.assertRaises(TypeError):
+            land[0].rast = np.full(dim, 0.5)
+
     def test_make_defined_scape(self):
         current_working_directory = os.getcwd()
         filepath = current_working_directory + "/GENOMICS_parameter.py"
@@ -0,0 +1,70 @@
+import unittest
+from geonomics.ops import mutation
+import geonomics as gnx
+import os
+import random
+import tempfile
+import numpy as np
+
+
+class MutationTestCases(unittest.TestCase):
+    """
+    Unit tests for mutation.py.
+    """
+    def test_mutation_log(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'log', 'mut_log.csv')
+            log = mutation._MutationLog(filepath, flush_interval=3)
+            self.assertEqual(len(log._read()), 0)
+            rows = [(t, t + 10, t * 2, ['neut', 'delet', 't0'][t % 3],
+                     t % 2, 0.1 * t) for t in range(7)]
+            for row in rows:
+                log._append(*row)
+            # rows are flushed whenever the buffer fills
+            self.assertEqual(len(log), 1)
+            df = log._read()
+            self.assertEqual(len(log), 0)
+            self.assertEqual([*df.columns], mutation._MutationLog._cols)
+            self.assertEqual([tuple(row) for row in df.itertuples(
+                                                    index=False)], rows)
+            # a new log at the same filepath starts a new file,
+            # rather than appending to the old one
+            log = mutation._MutationLog(filepath)
+            log._append(*rows[0])
+            log._flush()
+            with open(filepath, 'r') as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines, ['t,individ,locus,type,homol,effect_size',
+                                     '0,10,0,neut,0,0.0'])
+
+    def test_mutation_log_matches_tables(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'params.py')
+            gnx.make_parameters_file(filepath, species=[{'genomes': True,
+                                                         'n_traits': 1}])
+            params = gnx.read_parameters_file(filepath)
+            params.model['T'] = 10
+            gen_arch_params = params.comm.species.spp_0.gen_arch
+            gen_arch_params.update({'L': 1000, 'mu_neut': 1e-4,
+                                    'mu_delet': 1e-4,
+                                    'mut_log': os.path.join(tmpdir,
+                                                            'mut_log.csv')})
+            # (NOTE: monogenic traits' mutation rates are coerced to 0)
+            gen_arch_params.traits.trait_0.update({'n_loci': 5, 'mu': 1e-4})
+            np.random.seed(1)
+            random.seed(1)
+            mod = gnx.make_model(params)
+            mod.walk(10000, mode='burn', verbose=False)
+            spp = mod.comm[0]
+            n_muts = spp._tc.mutations.num_rows
+            mod.walk(5, mode='main', verbose=False)
+            # every mutation added to the tables is logged, once
+            df = spp._mut_log._read()
+            self.assertEqual(len(df),
+                             spp._tc.mutations.num_rows - n_muts)
+            self.assertEqual(set(df['type']), {'neut', 'delet', 't0'})
+            self.assertEqual(len(df), len(set(df['locus'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from geonomics.structs.genome import _get_neut_overlay_loci
+from geonomics.ops import selection
+from geonomics.ops import mutation
+from geonomics.sim import data
+import geonomics as gnx
+import os
+import random
+import tempfile
+import numpy as np
+
+
+def _make_model(seed, trait_params=None, **gen_arch_params):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepath = os.path.join(tmpdir, 'params.py')
+        gnx.make_parameters_file(filepath, species=[{'genomes': True,
+                                                     'n_traits': 1}])
+        params = gnx.read_parameters_file(filepath)
+    params.comm.species.spp_0.gen_arch.update(gen_arch_params)
+    if trait_params is not None:
+        params.comm.species.spp_0.gen_arch.traits.trait_0.update(trait_params)
+    np.random.seed(seed)
+    random.seed(seed)
+    mod = gnx.make_model(params)
+    mod.walk(10000, mode='burn', verbose=False)
+    return mod
+
+
+class SpeciesTestCases(unittest.TestCase):
+    """
+    Unit tests for species.py.
+    """
+    def test_recapitate_with_neutral_overlay(self):
+        mod = _make_model(8, recapitate=True, overlay_neut_muts=True)
+        mod.walk(5, mode='main', verbose=False)
+        spp = mod.comm[0]
+        self.assertIs(spp._recapitated, False)
+        spp._recapitate_table_collection()
+        self.assertIs(spp._recapitated, True)
+        # the recapitated tables are valid, and all of their mutations,
+        # starting and overlaid, have known times
+        ts = spp._tc.tree_sequence()
+        self.assertGreater(ts.num_mutations, 0)
+        self.assertTrue(np.all(np.isfinite(ts.tables.mutations.time)))
+
+    def test_overlay_neutral_mutations(self):
+        mod = _make_model(1, L=1000, mu_neut=1e-3, mu_delet=1e-5,
+                          overlay_neut_muts=True)
+        spp = mod.comm[0]
+        overlay_loci = _get_neut_overlay_loci(spp.gen_arch)
+        # the forward-time mutable loci are not overlay targets
+        self.assertEqual(len(np.intersect1d(overlay_loci,
+                                            spp.gen_arch._mutables)), 0)
+
+        # get the loci and times of the overlaid mutations
+        # NOTE: they are the only ones with non-integer times below 1,
+        # because starting mutations sit above the founders' nodes (at time
+        # 1) and forward-time mutations sit at their nodes' birth times
+        def get_overlaid_muts():
+            muts = spp._tc.mutations
+            overlaid = (muts.time < 1) & (muts.time != np.round(muts.time))
+            loci = spp._tc.sites.position[muts.site[overlaid]].astype(int)
+            return loci, muts.time[overlaid]
+
+        mod.walk(3, mode='main', verbose=False)
+        t1 = spp.t
+        spp._sort_simplify_table_collection()
+        loci, times = get_overlaid_muts()
+        self.assertGreater(len(times), 0)
+        self.assertTrue(np.all(np.isin(loci, overlay_loci)))
+        self.assertTrue(np.all((times >= -t1) & (times < 1)))
+        # sorting and simplifying again, before time moves on,
+        # overlays nothing new
+        spp._sort_simplify_table_collection()
+        self.assertTrue(np.array_equal(get_overlaid_muts()[1], times))
+
+        mod.walk(3, mode='main', verbose=False)
+        t2 = spp.t
+        # (sampling trees sorts and simplifies the tables, too)
+        data._get_sample_tables({idx: spp[idx] for idx in [*spp][:5]}, spp)
+        spp._sort_simplify_table_collection()
+        new_loci, new_times = get_overlaid_muts()
+        self.assertTrue(np.all(np.isin(new_loci, overlay_loci)))
+        self.assertTrue(np.all((new_times >= -t2) & (new_times < 1)))
+        # the new overlay only covers the interval since the last one, and
+        # the earlier interval was not overlaid again (simplification
+        # can only drop its mutations)
+        self.assertGreater(np.sum(new_times < -t1), 0)
+        self.assertLessEqual(np.sum(new_times >= -t1), len(times))
+
+    def test_trait_effects_cache(self):
+        mod = _make_model(1, trait_params={'n_loci': 5}, L=1000,
+                          mu_delet=1e-5)
+        mod.walk(2, mode='main', verbose=False)
+        spp = mod.comm[0]
+        gen_arch = spp.gen_arch
+        genomes = np.stack([ind.g for ind in spp.values()])
+
+        # get the effects and phenotypes both from the cache
+        # and rebuilt from scratch
+        def get_effects_and_phenotypes():
+            effects, nulls = selection._get_trait_effects(gen_arch)
+            z = selection._calc_phenotypes(genomes, gen_arch)
+            gen_arch._trait_effects = None
+            new_effects, new_nulls = selection._get_trait_effects(gen_arch)
+            new_z = selection._calc_phenotypes(genomes, gen_arch)
+            self.assertTrue(np.array_equal(effects, new_effects))
+            self.assertTrue(np.array_equal(nulls, new_nulls))
+            self.assertTrue(np.array_equal(z, new_z))
+            return effects, z
+
+        effects, z = get_effects_and_phenotypes()
+        self.assertIs(selection._get_trait_effects(gen_arch),
+                      gen_arch._trait_effects)
+        self.assertTrue(np.allclose(z, [ind.z for ind in spp.values()]))
+        # non-neutral mutations clear the cache, and it is rebuilt
+        # for the new non-neutral loci
+        # (NOTE: mutated individuals' phenotypes are updated right away,
+        # so by then the cache has already been rebuilt)
+        for mut_fn, args in [(mutation._do_trait_mutation, ([0],)),
+                             (mutation._do_deleterious_mutation, ())]:
+            cached = gen_arch._trait_effects
+            individ = mut_fn(spp, [*spp], *args)[0]
+            self.assertIsNot(gen_arch._trait_effects, cached)
+            genomes = np.stack([ind.g for ind in spp.values()])
+            effects, z = get_effects_and_phenotypes()
+            self.assertEqual(effects.shape, (len(gen_arch.nonneut_loci), 1))
+            self.assertTrue(np.allclose(z[[*spp].index(individ)],
+                                        spp[individ].z))
+
+
+if __name__ == '__main__':
+    unittest.main()